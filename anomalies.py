@@ -0,0 +1,109 @@
+# Validation and correction of the daily counts derived from a cumulative table.
+#
+# Works on every column at once and in linear time in the length of the history:
+#   missing    a column that drops back to zero (or has no value) after counting cases did not
+#              report that day, its cumulative value is carried forward
+#   dip        the cumulative count went down for a single day and was back the day after, a bad
+#              report that is carried forward like a missing one
+#   negative   the cumulative count went down for good. 'redistribute' lowers the earlier cumulative values
+#              to the later minimum, which takes the excess out of the days before and keeps the
+#              total, 'clamp' sets the day to zero and leaves the rest alone
+#   outlier    a day far above the median of the week before it, usually a backlog reported at
+#              once. 'spread' moves the excess over the median into the week before, or the days
+#              there are before it, keeping the total, 'report' only records it
+# Every changed day is recorded with its original and corrected value, cumulative for 'missing'
+# and daily for the others.
+import os
+
+import numpy as np
+import pandas as pd
+
+anomaly_strategy = os.environ.get('COVID_ANOMALY_STRATEGY', 'redistribute')
+outlier_strategy = os.environ.get('COVID_OUTLIER_STRATEGY', 'report')
+outlier_threshold = float(os.environ.get('COVID_OUTLIER_THRESHOLD', 10))
+outlier_window = 7
+# Days below this are never outliers, however quiet the week before was
+outlier_min_count = 50
+
+correction_columns = ['date', 'state', 'kind', 'original', 'corrected']
+
+
+def changes(kind, mask, original, corrected):
+    # One row per True cell of mask
+    rows, columns = np.nonzero(mask.to_numpy())
+    return pd.DataFrame({
+        'date': mask.index[rows],
+        'state': mask.columns[columns],
+        'kind': kind,
+        'original': original.to_numpy(dtype=float)[rows, columns],
+        'corrected': corrected.to_numpy(dtype=float)[rows, columns],
+    }, columns=correction_columns)
+
+
+def find_outliers(daily, reference, threshold=outlier_threshold, window=outlier_window):
+    # Days of daily far above the median of the week before them in reference
+    history = reference.shift(1)
+    baseline = history.rolling(window).median()
+    spread = (history - baseline).abs().rolling(window).median() * 1.4826
+    limit = baseline + threshold * np.maximum(spread, np.sqrt(baseline.clip(lower=1)))
+    return (daily > limit) & (daily >= outlier_min_count), baseline
+
+
+def spread_excess(daily, excess, window=outlier_window):
+    # Take excess out of its days and share it equally among the window days before each, fewer
+    # near the start of the history. Nothing can move before the first day, its excess stays
+    excess = excess.copy()
+    excess.iloc[0] = 0
+    before = np.minimum(np.arange(len(excess)), window).reshape(-1, 1)
+    share = excess / np.maximum(before, 1)
+    # Day t receives the share of every excess within the window days after it
+    received = share.iloc[::-1].rolling(window, min_periods=1).sum().iloc[::-1].shift(-1).fillna(0)
+    spread_daily = daily - excess + received
+    # Round on the running total so the days stay whole and the total is kept
+    return spread_daily.cumsum().round().diff().fillna(spread_daily.iloc[0].round())
+
+
+def correct(cumulative, strategy=anomaly_strategy, outliers=outlier_strategy, threshold=outlier_threshold):
+    # cumulative: one column per state, one row per day. Returns the daily counts, the first day
+    # being zero, and the corrections made
+    if strategy not in ('redistribute', 'clamp'):
+        raise ValueError(f'unknown anomaly strategy {strategy!r}')
+    if outliers not in ('spread', 'report'):
+        raise ValueError(f'unknown outlier strategy {outliers!r}')
+
+    values = cumulative.astype(float)
+    reports = []
+
+    started = values.gt(0).cummax()
+    missing = started & (values.isna() | values.eq(0))
+    filled = values.mask(missing).ffill().fillna(0)
+    reports.append(changes('missing', missing, values, filled))
+
+    previous = filled.shift(1)
+    dip = filled.lt(previous) & filled.shift(-1).ge(previous)
+    undipped = filled.mask(dip).ffill()
+    reports.append(changes('dip', dip, filled, undipped))
+    filled = undipped
+
+    raw_daily = filled.diff().fillna(0)
+    if strategy == 'redistribute':
+        monotonic = filled.iloc[::-1].cummin().iloc[::-1]
+        daily = monotonic.diff().fillna(0)
+    else:
+        daily = raw_daily.clip(lower=0)
+    negative = raw_daily.lt(0)
+    reports.append(changes('negative', negative, raw_daily, daily))
+    reports.append(changes('redistributed', daily.ne(raw_daily) & ~negative, raw_daily, daily))
+
+    # Judged against the days as reported, a redistribution can leave a run of zero days behind
+    is_outlier, baseline = find_outliers(daily, raw_daily.clip(lower=0), threshold)
+    if outliers == 'spread' and is_outlier.values.any():
+        spread_daily = spread_excess(daily, (daily - baseline).where(is_outlier, 0))
+        reports.append(changes('outlier', is_outlier, daily, spread_daily))
+        reports.append(changes('spread', spread_daily.ne(daily) & ~is_outlier, daily, spread_daily))
+        daily = spread_daily
+    else:
+        reports.append(changes('outlier', is_outlier, daily, daily))
+
+    corrections = pd.concat(reports, ignore_index=True)
+    return daily, corrections.sort_values('date', kind='stable', ignore_index=True)
@@ -0,0 +1,19 @@
+// Bar chart of the states. The figure comes with the page and holds a trace for each population
+// measure, the dropdown shows one of them without a request to the server.
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    bar_graph: {
+        population: function (populationType, figure) {
+            if (!figure) {
+                return window.dash_clientside.no_update;
+            }
+            var data = figure.data.map(function (trace) {
+                if (!trace.meta || trace.meta.population === undefined) {
+                    return trace;
+                }
+                return Object.assign({}, trace, {visible: trace.meta.population === populationType});
+            });
+            var yaxis = Object.assign({}, figure.layout.yaxis, {title: {text: '<b>' + populationType + '</b>'}});
+            return {data: data, layout: Object.assign({}, figure.layout, {yaxis: yaxis})};
+        }
+    }
+});
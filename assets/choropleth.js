@@ -0,0 +1,39 @@
+// Loads the prebuilt choropleth animation once its container scrolls into view.
+// The figure is served by the Flask server from figures/choropleth.json (see static_figures.py), at
+// the URL the layout puts in the data-figure-url attribute around the chart, so that it follows the
+// prefix the app is served under.
+(function () {
+    var GRAPH_ID = 'choropleth';
+
+    function load(container) {
+        var graphDiv = container.querySelector('.js-plotly-plot');
+        fetch(container.closest('[data-figure-url]').getAttribute('data-figure-url'))
+            .then(function (response) { return response.json(); })
+            .then(function (figure) { return window.Plotly.react(graphDiv, figure); });
+    }
+
+    function watch() {
+        var container = document.getElementById(GRAPH_ID);
+        if (!container || !container.querySelector('.js-plotly-plot') || !window.Plotly) {
+            setTimeout(watch, 250);
+            return;
+        }
+        if (!('IntersectionObserver' in window)) {
+            load(container);
+            return;
+        }
+        var observer = new IntersectionObserver(function (entries) {
+            if (entries.some(function (entry) { return entry.isIntersecting; })) {
+                observer.disconnect();
+                load(container);
+            }
+        }, {rootMargin: '200px'});
+        observer.observe(container);
+    }
+
+    if (document.readyState === 'loading') {
+        document.addEventListener('DOMContentLoaded', watch);
+    } else {
+        watch();
+    }
+})();
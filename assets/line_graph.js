@@ -0,0 +1,80 @@
+// Line chart. view() reports the visible date range and pixel width of the chart, the server
+// returns the requested series cut to that range and downsampled to that width (see downsample.py),
+// so zooming in fetches more detail. request() asks for the checked series and statistics, only when
+// the view changed or one was checked that the last request left out. figure() picks the checked
+// ones out of what the server sent and puts them on their axes, so unchecking needs no request.
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    line_graph: {
+        view: function (relayoutData) {
+            var range;
+            if (!relayoutData) {
+                return window.dash_clientside.no_update;
+            } else if (relayoutData['xaxis.range[0]'] !== undefined) {
+                range = [relayoutData['xaxis.range[0]'], relayoutData['xaxis.range[1]']];
+            } else if (relayoutData['xaxis.range']) {
+                range = relayoutData['xaxis.range'];
+            } else if (relayoutData['xaxis.autorange']) {
+                range = null;
+            } else {
+                // Zooming a y axis or resizing leaves the dates as they are
+                return window.dash_clientside.no_update;
+            }
+            var graph = document.getElementById('line_graph');
+            return {range: range, width: graph ? graph.offsetWidth : null};
+        },
+
+        shown: function (checkedItems) {
+            // Up to two series, the first on the left axis and the second on the right
+            return checkedItems.length ? checkedItems.slice(0, 2) : ['new_cases,New Cases,Number of New Cases'];
+        },
+
+        request: function (view, checkedItems, checkedStats, previous) {
+            var columns = window.dash_clientside.line_graph.shown(checkedItems).map(function (item) {
+                return item.split(',')[0];
+            });
+            var range = view ? view.range : null;
+            var width = view ? view.width : null;
+            if (previous && JSON.stringify(previous.range) === JSON.stringify(range) && previous.width === width &&
+                    columns.every(function (column) { return previous.columns.indexOf(column) !== -1; }) &&
+                    checkedStats.every(function (stat) { return previous.stats.indexOf(stat) !== -1; })) {
+                return window.dash_clientside.no_update;
+            }
+            return {range: range, width: width, columns: columns, stats: checkedStats.slice()};
+        },
+
+        figure: function (checkedItems, checkedStats, series) {
+            if (!series) {
+                return window.dash_clientside.no_update;
+            }
+            var items = window.dash_clientside.line_graph.shown(checkedItems);
+            var layout = Object.assign({}, series.layout);
+            var data = [];
+            var rates = false;
+
+            items.forEach(function (item, i) {
+                var parts = item.split(',');
+                var axis = i === 0 ? 'y' : 'y2';
+                var axisName = i === 0 ? 'yaxis' : 'yaxis2';
+                series.data.forEach(function (trace) {
+                    var meta = trace.meta || {};
+                    if (meta.column !== parts[0]) {
+                        return;
+                    }
+                    if (!meta.stat) {
+                        data.push(Object.assign({}, trace, {yaxis: axis}));
+                    } else if (checkedStats.indexOf(meta.stat) !== -1) {
+                        // Growth and Rt have no unit, they go on an axis of their own
+                        var rate = meta.stat === 'growth_7' || meta.stat === 'rt';
+                        rates = rates || rate;
+                        data.push(Object.assign({}, trace, {yaxis: rate ? 'y3' : axis}));
+                    }
+                });
+                layout[axisName] = Object.assign({}, series.layout[axisName], {title: {text: '<b>' + parts[2] + '</b>'}});
+            });
+
+            layout.yaxis3 = Object.assign({}, series.layout.yaxis3, {visible: rates});
+            layout.xaxis = Object.assign({}, series.layout.xaxis, {domain: rates ? [0, 0.9] : [0, 1]});
+            return {data: data, layout: layout};
+        }
+    }
+});
@@ -0,0 +1,53 @@
+# Anomaly correction of the daily-by-state table: time per day of history as the history grows,
+# which stays flat when the correction is linear. Every history gets the same rate of missing
+# reports, one-day dips, lasting drops and backlogs.
+#
+#   python benchmarks/anomalies.py [regions]
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import anomalies  # noqa: E402
+import synthetic  # noqa: E402
+
+
+def damaged_frame(years, regions, seed=0):
+    df = synthetic.states_frame(years, ['region-%d' % i for i in range(regions)], seed=seed)
+    df = df.set_index('date')
+    df = df.where(df != '-', 0).astype(int)
+
+    rng = np.random.default_rng(seed)
+    values = df.to_numpy()
+    n_days = len(df)
+    for _ in range(n_days * regions // 200):
+        day, column = rng.integers(10, n_days - 1), rng.integers(0, regions)
+        kind = rng.integers(0, 4)
+        if kind == 0:
+            values[day, column] = 0
+        elif kind == 1:
+            values[day, column] -= 30
+        elif kind == 2:
+            values[day:, column] -= 20
+        else:
+            values[day:, column] += 2000
+    df[:] = values
+
+    return df
+
+
+if __name__ == '__main__':
+    regions = int(sys.argv[1]) if len(sys.argv) > 1 else 16
+
+    for years in (1, 10, 100):
+        df = damaged_frame(years, regions)
+        start = time.perf_counter()
+        daily, corrections = anomalies.correct(df, outliers='spread')
+        elapsed = time.perf_counter() - start
+        assert (daily >= 0).all().all()
+
+        print(f'{years:4d} years x {regions} regions: {elapsed:7.3f} s  '
+              f'{elapsed / len(df) * 1e6:6.1f} us/day  {len(corrections)} corrections')
@@ -0,0 +1,95 @@
+# Payload size of the prepared Malaysia GeoJSON at several simplification tolerances, plus an
+# HTML page that measures the browser render time of a choropleth for each of them.
+#
+#   python benchmarks/geojson.py [path-to-geojson] [--html report.html]
+#
+# Without a path the cached upstream file is used. Open the HTML report in a browser; it renders
+# each variant a few times with Plotly.js and fills in the median render time.
+import gzip
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import geojson_tools  # noqa: E402
+
+tolerances = [0, 0.001, 0.0025, 0.005, 0.01, 0.02]
+
+html_template = '''<!doctype html>
+<html>
+<head><script src="https://cdn.plot.ly/plotly-2.35.2.min.js"></script></head>
+<body>
+<table border="1" cellpadding="4"><thead><tr>
+<th>tolerance</th><th>vertices</th><th>JSON bytes</th><th>gzip bytes</th><th>median render ms</th>
+</tr></thead><tbody id="rows"></tbody></table>
+<div id="plot" style="width:1200px;height:450px"></div>
+<script>
+const variants = %s;
+async function run() {
+    const rows = document.getElementById('rows');
+    for (const v of variants) {
+        const names = v.geojson.features.map(f => f.properties.name);
+        const trace = {type: 'choropleth', geojson: v.geojson, featureidkey: 'properties.name',
+                       locations: names, z: names.map((_, i) => i)};
+        const layout = {geo: {fitbounds: 'geojson', visible: false}, width: 1200, height: 450};
+        const timings = [];
+        for (let i = 0; i < 5; i++) {
+            Plotly.purge('plot');
+            const start = performance.now();
+            await Plotly.newPlot('plot', [trace], layout);
+            timings.push(performance.now() - start);
+        }
+        timings.sort((a, b) => a - b);
+        rows.insertAdjacentHTML('beforeend', `<tr><td>${v.tolerance}</td><td>${v.vertices}</td>` +
+            `<td>${v.bytes}</td><td>${v.gzip_bytes}</td><td>${timings[2].toFixed(1)}</td></tr>`);
+    }
+}
+run();
+</script>
+</body>
+</html>
+'''
+
+
+def vertex_count(geojson):
+    return sum(len(ring) for feature in geojson['features']
+               for polygon in geojson_tools.polygons(feature['geometry']) for ring in polygon)
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    html_path = None
+    if '--html' in args:
+        html_path = args.pop(args.index('--html') + 1)
+        args.remove('--html')
+
+    if args:
+        path = args[0]
+    else:
+        import data_cache
+        import data_preprocess
+        path = data_cache.fetch(data_preprocess.url_geojson)
+    with open(path) as f:
+        original = json.load(f)
+
+    raw = json.dumps(original, separators=(',', ':')).encode('utf-8')
+    print(f'{"original":>10} {vertex_count(original):9d} vertices {len(raw):10d} bytes '
+          f'{len(gzip.compress(raw)):9d} gzip')
+
+    variants = []
+    for tolerance in tolerances:
+        start = time.perf_counter()
+        prepared = geojson_tools.prepare(original, tolerance=tolerance)
+        elapsed = time.perf_counter() - start
+        body = json.dumps(prepared, separators=(',', ':')).encode('utf-8')
+        variants.append({'tolerance': tolerance, 'vertices': vertex_count(prepared), 'bytes': len(body),
+                         'gzip_bytes': len(gzip.compress(body)), 'geojson': prepared})
+        print(f'{tolerance:10.4f} {variants[-1]["vertices"]:9d} vertices {len(body):10d} bytes '
+              f'{variants[-1]["gzip_bytes"]:9d} gzip   prepared in {elapsed * 1000:.0f} ms')
+
+    if html_path:
+        with open(html_path, 'w') as f:
+            f.write(html_template % json.dumps(variants))
+        print(f'browser render timings: open {html_path}')
@@ -0,0 +1,78 @@
+# Load time and peak RSS of the full-frame OWID load against the local Parquet store, for the
+# Malaysia rows and data_global, the latest values of every country.
+#
+#   python benchmarks/ingest.py [path-to-owid-csv]
+#
+# Without a path the cached upstream file is used. Each variant runs in its own process so the
+# peak RSS figures do not contaminate each other. 'store-build' is the one-off chunked ingest of
+# the CSV into an empty store, 'store-load' is what every later start pays.
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import data_preprocess  # noqa: E402
+import data_store  # noqa: E402
+
+
+def snapshot_methods():
+    # The methods building data_global, without building a whole snapshot
+    return data_preprocess.Data.__new__(data_preprocess.Data)
+
+
+def load_full(path):
+    df = pd.read_csv(path)
+    data = df[df.iso_code == 'MYS']
+    columns = ['iso_code', 'continent', 'location', 'date'] + data_preprocess.owid_latest_columns
+    data_global = snapshot_methods().latest_by_country(df[columns])
+    return data, data_global
+
+
+def build_store(path):
+    shutil.rmtree(data_store.dataset_dir('owid'), ignore_errors=True)
+    data_store.refresh('owid', path, 'date', '%Y-%m-%d', key_column='iso_code',
+                       chunksize=data_preprocess.owid_chunksize, usecols=data_preprocess.owid_columns,
+                       dtype=data_preprocess.owid_dtypes)
+
+
+def load_store(path):
+    data = data_store.load('owid', filters=[('iso_code', '==', 'MYS')])
+    data_global = snapshot_methods().load_latest_by_country()
+    return data, data_global
+
+
+variants = {'full': load_full, 'store-build': build_store, 'store-load': load_store}
+
+
+def run(variant, path):
+    # Imports are excluded from both the timing and the RSS figure
+    baseline_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    start = time.perf_counter()
+    variants[variant](path)
+    elapsed = time.perf_counter() - start
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f'{variant:>11}: {elapsed:7.2f} s   peak RSS {peak_mb:8.1f} MB (+{peak_mb - baseline_mb:.1f} MB over imports)')
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 2 and sys.argv[1] == '--run':
+        run(sys.argv[2], sys.argv[3])
+        sys.exit()
+
+    if len(sys.argv) > 1:
+        csv_path = sys.argv[1]
+    else:
+        import data_cache
+        csv_path = data_cache.fetch(data_preprocess.url_first_dataset)
+
+    print(f'{csv_path} ({os.path.getsize(csv_path) / 2 ** 20:.1f} MB)')
+    os.environ.setdefault('COVID_STORE_DIR', tempfile.mkdtemp(prefix='bench-store-'))
+    for name in variants:
+        subprocess.run([sys.executable, __file__, '--run', name, csv_path], check=True)
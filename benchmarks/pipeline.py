@@ -0,0 +1,211 @@
+# Time and peak memory of every stage of the data pipeline and of every figure build, offline.
+#
+#   python benchmarks/pipeline.py [--years N] [--regions N] [--countries N] [--repeat N]
+#                                 [--baseline PATH] [--save-baseline]
+#                                 [--tolerance F] [--min-seconds S] [--min-mb MB]
+#
+# Synthetic OWID, by-region and national datasets of the requested size (see synthetic.py), a region
+# table and a GeoJSON with one square per region are written into a temporary cache and store, so
+# nothing is downloaded. 'build' is a whole Data() on an up-to-date store, the other data stages are
+# the Data methods on its frames. Each figure is timed twice: 'build' is what a cache miss costs, the
+# callback body and turning its figure into the cached plain dict, 'json' encoding the cached figure
+# into the callback response the way Dash does. Prebuilt figures are timed building and compressing.
+#
+# Times are the best of --repeat runs, peak memory is what tracemalloc saw during one more run.
+# With --save-baseline the results are written to --baseline. Otherwise they are compared with it,
+# any stage slower or bigger than the baseline by more than --tolerance, and by more than
+# --min-seconds or --min-mb, is flagged and the exit status is 1. Compare runs of the same size on
+# the same machine.
+import argparse
+import gzip
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, root)
+
+import synthetic  # noqa: E402
+
+default_baseline = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+
+def write_sources(years, regions, countries):
+    # Cache the synthetic sources under the upstream URLs, checked far in the future so they are
+    # never revalidated, and write the region table
+    import data_cache
+    import data_preprocess
+
+    os.makedirs(data_cache.CACHE_DIR, exist_ok=True)
+    names = ['region-%d' % i for i in range(regions)]
+    rng = np.random.default_rng(0)
+
+    def put(url, write):
+        path = data_cache.cache_path(url)
+        write(path)
+        with open(path + '.meta.json', 'w') as f:
+            json.dump({'url': url, 'checked': time.time() + 10 ** 9}, f)
+
+    put(data_preprocess.url_first_dataset,
+        lambda path: synthetic.owid_frame(years, countries).to_csv(path, index=False))
+    put(data_preprocess.url_cumulative_bystate,
+        lambda path: synthetic.states_frame(years, names).to_csv(path, index=False))
+    put(data_preprocess.url_cumulative_my,
+        lambda path: synthetic.cumulative_my_frame(years).to_csv(path, index=False))
+
+    features = [{'type': 'Feature', 'properties': {'name': name},
+                 'geometry': {'type': 'Polygon', 'coordinates': [[[i, 0], [i + 1, 0], [i + 1, 1], [i, 1], [i, 0]]]}}
+                for i, name in enumerate(names)]
+    put(data_preprocess.url_geojson,
+        lambda path: json.dump({'type': 'FeatureCollection', 'features': features}, open(path, 'w')))
+
+    pd.DataFrame({'key': names, 'name': names, 'geojson_key': names,
+                  'population': rng.integers(10000, 5000000, regions),
+                  'area': rng.integers(10, 100000, regions)}).to_csv(data_preprocess.regions_table, index=False)
+
+
+def measure(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return {'seconds': min(timings), 'peak_mb': peak / 2 ** 20}
+
+
+def data_stages(snapshot):
+    import data_store
+
+    # Each method only reads the frames the build made before it
+    Data = type(snapshot)
+    data = Data.from_frames({'regions': snapshot.regions,
+                             'df_cumulative_bystate': snapshot.df_cumulative_bystate,
+                             'df_daily_bystate': snapshot.df_daily_bystate}, snapshot.version)
+    states = data_store.load('states')
+
+    return {
+        'build': Data,
+        'preprocess_data': lambda: data.preprocess_data(states.copy()),
+        'restructure_dataframe': lambda: data.restructure_dataframe(snapshot.df_cumulative_bystate),
+        'get_daily_bystate': data.get_daily_bystate,
+        'get_monthly_bystate': lambda: data.get_monthly_bystate(snapshot.df_daily_bystate),
+        'get_case_with_pop': data.get_case_with_pop,
+    }
+
+
+def figure_stages(main, snapshot):
+    import plotly.utils
+
+    import figure_cache
+    import plain_figure
+
+    # What the on_swap listeners do, without warming the caches or fitting forecasts
+    main.snapshot.snapshot = snapshot
+    main.statistics.update(snapshot)
+    main.ranks.update(snapshot)
+
+    stages = {}
+    for name, (func, domain) in main.figures.builders.items():
+        args = tuple(next(iter(domain())))
+        response = {'response': {name: {'figure': figure_cache.to_plain(func(*args))}}, 'multi': True}
+        stages[f'{name}:build'] = lambda func=func, args=args: figure_cache.to_plain(func(*args))
+        stages[f'{name}:json'] = lambda response=response: json.dumps(response, cls=plotly.utils.PlotlyJSONEncoder)
+    for name, func in main.prebuilt_figures.builders.items():
+        figure = func()
+        stages[f'{name}:build'] = func
+        stages[f'{name}:json'] = lambda figure=figure: gzip.compress(
+            plain_figure.to_json(figure).encode('utf-8'), compresslevel=9)
+
+    return stages
+
+
+def compare(results, baseline, tolerance, floors):
+    # A stage regressed when it grew by more than the tolerance and by more than the floor, the
+    # floor keeps the jitter of stages taking a few milliseconds from being flagged
+    regressions = []
+    for stage, result in results.items():
+        before = baseline.get(stage)
+        if before is None:
+            continue
+        for key, floor in floors.items():
+            if result[key] > before[key] * (1 + tolerance) and result[key] - before[key] > floor:
+                regressions.append((stage, key, before[key], result[key]))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--years', type=int, default=3, help='at least 2, vaccinations start in 2021')
+    parser.add_argument('--regions', type=int, default=16)
+    parser.add_argument('--countries', type=int, default=200)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--baseline', default=default_baseline)
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    parser.add_argument('--min-seconds', type=float, default=0.01)
+    parser.add_argument('--min-mb', type=float, default=1.0)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix='covid-bench-')
+    # The modules read these when they are imported
+    os.environ['COVID_CACHE_DIR'] = os.path.join(directory, 'cache')
+    os.environ['COVID_STORE_DIR'] = os.path.join(directory, 'store')
+    os.environ['COVID_REGIONS_TABLE'] = os.path.join(directory, 'regions.csv')
+    write_sources(args.years, args.regions, args.countries)
+
+    import data_preprocess
+    import refresher
+
+    # The benchmark swaps its own snapshot in, main must not start building one on import
+    refresher.DataRefresher.start = lambda self: None
+    import main as dashboard
+
+    # The first build ingests the sources into the store, the timed ones find it up to date
+    snapshot = data_preprocess.Data()
+    stages = dict(data_stages(snapshot), **figure_stages(dashboard, snapshot))
+
+    size = f'{args.years} years x {args.regions} regions x {args.countries} countries'
+    results = {}
+    print(size)
+    for stage, func in stages.items():
+        results[stage] = measure(func, args.repeat)
+        print(f'  {stage:34s} {results[stage]["seconds"] * 1000:9.1f} ms  {results[stage]["peak_mb"]:8.1f} MB')
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump({'size': size, 'stages': results}, f, indent=1)
+        print(f'baseline saved to {args.baseline}')
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print('no baseline to compare with, run with --save-baseline first')
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline['size'] != size:
+        print(f'baseline is for {baseline["size"]}, not comparing')
+        return 0
+
+    regressions = compare(results, baseline['stages'], args.tolerance,
+                          {'seconds': args.min_seconds, 'peak_mb': args.min_mb})
+    for stage, key, before, after in regressions:
+        print(f'REGRESSION {stage} {key}: {before:.3f} -> {after:.3f} ({after / before - 1:+.0%})')
+    if not regressions:
+        print(f'no regressions beyond {args.tolerance:.0%} of the baseline')
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,72 @@
+# Wide-to-long reshape of the cumulative-by-state table: the per-state append loop it replaced
+# against Data.wide_to_long + Data.extract_year_month.
+#
+#   python benchmarks/restructure.py [years] [regions]
+import os
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import data_preprocess  # noqa: E402
+import synthetic  # noqa: E402
+
+
+def restructure_loop(df):
+    # The original implementation, with DataFrame.append spelled as pd.concat. It reads the dates as
+    # the dd/mm/yyyy strings of the source and gives year_month as yyyy/mm strings
+    columns = df.columns
+    df_temp = df[['date', columns[1]]].copy()
+    df_temp.columns = ['date', 'cumulative case']
+    df_temp['state'] = columns[1]
+
+    for i in range(2, len(columns)):
+        df2 = df[['date', columns[i]]].copy()
+        df2.columns = ['date', 'cumulative case']
+        df2['state'] = columns[i]
+        df_temp = pd.concat([df_temp, df2], ignore_index=True)
+
+    year_month = []
+    for date in df_temp['date'].values:
+        date_split = date.split("/")
+        year_month.append(date_split[2] + "/" + date_split[1])
+    df_temp['year_month'] = year_month
+
+    return df_temp
+
+
+def restructure_vectorized(df):
+    # Dates are parsed once by preprocess_data, year_month is a Period[M]
+    data = data_preprocess.Data.__new__(data_preprocess.Data)
+    return data.extract_year_month(data.wide_to_long(df))
+
+
+def best_of(func, df, repeat=3):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(df)
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+if __name__ == '__main__':
+    years = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    regions = int(sys.argv[2]) if len(sys.argv) > 2 else 300
+
+    df = synthetic.states_frame(years, ['region-%d' % i for i in range(regions)])
+    df[df.columns[1:]] = df[df.columns[1:]].where(df[df.columns[1:]] != '-', 0).astype(int)
+    parsed = df.assign(date=pd.to_datetime(df['date'], format='%d/%m/%Y'))
+
+    loop_time, expected = best_of(restructure_loop, df)
+    vectorized_time, result = best_of(restructure_vectorized, parsed)
+
+    expected['date'] = pd.to_datetime(expected['date'], format='%d/%m/%Y')
+    expected['year_month'] = pd.PeriodIndex(expected['year_month'].str.replace('/', '-'), freq='M')
+    pd.testing.assert_frame_equal(result, expected)
+
+    print(f'{years} years x {regions} regions -> {len(result)} rows')
+    print(f'append loop: {loop_time:8.3f} s')
+    print(f'vectorized:  {vectorized_time:8.3f} s  ({loop_time / vectorized_time:.0f}x)')
@@ -0,0 +1,101 @@
+# Worker startup: how long `import main` takes and how long until the app answers.
+#
+#   python benchmarks/startup.py [--runs N] [--gunicorn]
+#
+# Every run is a fresh interpreter. 'import' is the time to import main, 'healthy' the time from
+# interpreter start to the first 200 from /healthz, 'ready' the time until /healthz reports the data
+# as loaded. With --gunicorn the same is measured over HTTP against a real gunicorn master with one
+# worker, so the figures include the fork and the worker boot.
+#
+# Point COVID_CACHE_DIR at a warm cache to leave the network out of the 'ready' figures.
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+probe = """
+import json, sys, time
+start = time.perf_counter()
+import main
+imported = time.perf_counter()
+client = main.server.test_client()
+response = client.get('/healthz')
+healthy = time.perf_counter()
+while not response.get_json()['ready']:
+    time.sleep(0.05)
+    response = client.get('/healthz')
+ready = time.perf_counter()
+print(json.dumps({'import': imported - start, 'healthy': healthy - start, 'ready': ready - start,
+                  'status': response.status_code}))
+"""
+
+
+def run_in_process():
+    output = subprocess.run([sys.executable, '-c', probe], cwd=root, check=True, capture_output=True, text=True)
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def get_health(port):
+    try:
+        with urllib.request.urlopen(f'http://127.0.0.1:{port}/healthz', timeout=1) as response:
+            return json.load(response)
+    except OSError:
+        return None
+
+
+def run_gunicorn(timeout=300):
+    port = free_port()
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-w', '1', '-b', f'127.0.0.1:{port}', 'main:server'],
+                               cwd=root, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    result = {}
+    try:
+        while time.perf_counter() - start < timeout:
+            health = get_health(port)
+            if health is not None:
+                result.setdefault('healthy', time.perf_counter() - start)
+                if health['ready']:
+                    result['ready'] = time.perf_counter() - start
+                    break
+            time.sleep(0.05)
+    finally:
+        process.terminate()
+        process.wait()
+
+    return result
+
+
+def summarize(label, runs):
+    print(label)
+    for key in ('import', 'healthy', 'ready'):
+        values = [run[key] for run in runs if key in run]
+        if values:
+            print(f'  {key:8s} median {statistics.median(values):6.2f}s  min {min(values):6.2f}s  max {max(values):6.2f}s')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--gunicorn', action='store_true')
+    args = parser.parse_args()
+
+    summarize('in process', [run_in_process() for _ in range(args.runs)])
+    if args.gunicorn:
+        summarize('gunicorn, 1 worker', [run_gunicorn() for _ in range(args.runs)])
+
+
+if __name__ == '__main__':
+    main()
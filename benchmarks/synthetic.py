@@ -0,0 +1,73 @@
+# Synthetic datasets shaped like the upstream sources, so the pipeline can be measured offline
+import numpy as np
+import pandas as pd
+
+continents = ['Asia', 'Europe', 'Africa', 'North America', 'South America', 'Oceania']
+
+# Filler columns so the frame is as wide as the real OWID file
+owid_extra_columns = ['extra_%d' % i for i in range(55)]
+
+
+def owid_frame(years=3, countries=200, seed=0):
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range('2020-01-22', periods=365 * years, freq='D')
+    n_days = len(dates)
+
+    iso_codes = ['MYS'] + ['C%02d' % i for i in range(countries - 1)]
+    locations = ['Malaysia'] + ['Country %d' % i for i in range(countries - 1)]
+    country_continent = ['Asia'] + [continents[i % len(continents)] for i in range(countries - 1)]
+    population = rng.integers(100000, 100000000, countries).astype(float)
+
+    new_cases = rng.poisson(200, (countries, n_days)).astype(float)
+    new_deaths = rng.poisson(3, (countries, n_days)).astype(float)
+    people_vaccinated = np.cumsum(rng.poisson(1000, (countries, n_days)), axis=1).astype(float)
+
+    df = pd.DataFrame({
+        'iso_code': np.repeat(iso_codes, n_days),
+        'continent': np.repeat(country_continent, n_days),
+        'location': np.repeat(locations, n_days),
+        'date': np.tile(dates.strftime('%Y-%m-%d'), countries),
+        'total_cases': np.cumsum(new_cases, axis=1).ravel(),
+        'new_cases': new_cases.ravel(),
+        'total_deaths': np.cumsum(new_deaths, axis=1).ravel(),
+        'new_deaths': new_deaths.ravel(),
+        'people_vaccinated': people_vaccinated.ravel(),
+        'people_fully_vaccinated': (people_vaccinated * 0.8).ravel(),
+        'stringency_index': rng.uniform(0, 100, countries * n_days).round(2),
+        'population': np.repeat(population, n_days),
+    })
+    for column in owid_extra_columns:
+        df[column] = rng.random(len(df))
+
+    return df
+
+
+state_columns = ['perlis', 'kedah', 'pulau-pinang', 'perak', 'selangor', 'negeri-sembilan', 'melaka', 'johor', 'pahang',
+                 'terengganu', 'kelantan', 'sabah', 'sarawak', 'wp-kuala-lumpur', 'wp-putrajaya', 'wp-labuan']
+
+
+def states_frame(years=3, states=state_columns, seed=0):
+    # Wide cumulative cases by state, dates as dd/mm/yyyy and "-" before a state's first case
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range('2020-01-25', periods=365 * years, freq='D')
+    cumulative = np.cumsum(rng.poisson(50, (len(dates), len(states))), axis=0).astype(object)
+    cumulative[:5, -1] = '-'
+
+    df = pd.DataFrame(cumulative, columns=states)
+    df.insert(0, 'date', dates.strftime('%d/%m/%Y'))
+
+    return df
+
+
+def cumulative_my_frame(years=3, seed=0):
+    # National cumulative cases, deaths and recoveries shaped like covid-19_my.csv
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range('2020-01-25', periods=365 * years, freq='D')
+    new_cases = rng.poisson(1000, len(dates))
+    new_deaths = rng.poisson(10, len(dates))
+    recover = rng.poisson(900, len(dates))
+
+    return pd.DataFrame({'date': dates.strftime('%Y-%m-%d'),
+                         'new_cases': new_cases, 'total_cases': np.cumsum(new_cases),
+                         'new_deaths': new_deaths, 'total_deaths': np.cumsum(new_deaths),
+                         'recover': recover, 'total_recover': np.cumsum(recover)})
@@ -0,0 +1,101 @@
+# On-disk cache for the remote datasets used by the dashboard.
+#
+# Every source is stored once under CACHE_DIR together with a small metadata file holding its
+# ETag / Last-Modified headers. Within the TTL the cached copy is used as is; after that the
+# remote copy is revalidated with a conditional request and only downloaded again if it changed.
+import fcntl
+import hashlib
+import http.client
+import json
+import os
+import shutil
+import tempfile
+import time
+from urllib.error import HTTPError, URLError
+from urllib.request import Request, urlopen
+
+CACHE_DIR = os.environ.get('COVID_CACHE_DIR',
+                           os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache'))
+DEFAULT_TTL = int(os.environ.get('COVID_CACHE_TTL', 3600))
+DOWNLOAD_TIMEOUT = 120
+
+
+def cache_path(url):
+    # Keep the original file name so the cache directory stays readable
+    digest = hashlib.sha1(url.encode('utf-8')).hexdigest()[:12]
+    return os.path.join(CACHE_DIR, digest + '-' + os.path.basename(url))
+
+
+def read_meta(path):
+    try:
+        with open(path + '.meta.json') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_atomic(path, source, length=None):
+    # Write into a temporary file in the same directory, then rename it over the target so
+    # readers in other workers never see a partially written file. With length given, a source
+    # that ends early is an error and leaves the target as it was
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            if isinstance(source, bytes):
+                f.write(source)
+            else:
+                shutil.copyfileobj(source, f)
+            if length is not None and f.tell() != length:
+                raise http.client.IncompleteRead(b'', length - f.tell())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def fetch(url, ttl=DEFAULT_TTL):
+    """Return the path of an up-to-date local copy of url."""
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    path = cache_path(url)
+
+    # Serialise refreshes of the same file across processes
+    with open(path + '.lock', 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+
+        meta = read_meta(path)
+        cached = meta is not None and os.path.exists(path)
+        if cached and time.time() - meta['checked'] < ttl:
+            return path
+
+        headers = {}
+        if cached:
+            if meta.get('etag'):
+                headers['If-None-Match'] = meta['etag']
+            if meta.get('last_modified'):
+                headers['If-Modified-Since'] = meta['last_modified']
+
+        try:
+            with urlopen(Request(url, headers=headers), timeout=DOWNLOAD_TIMEOUT) as response:
+                length = response.headers.get('Content-Length')
+                write_atomic(path, response, int(length) if length else None)
+                meta = {'url': url,
+                        'etag': response.headers.get('ETag'),
+                        'last_modified': response.headers.get('Last-Modified'),
+                        'downloaded': time.time()}
+        except HTTPError as e:
+            if not cached:
+                raise
+            # Anything but 304 Not Modified is a server error, keep serving the stale copy
+            if e.code != 304:
+                return path
+        except (URLError, OSError, http.client.HTTPException):
+            # Remote is unreachable or the download broke off, serve the stale copy rather than
+            # failing the whole app
+            if not cached:
+                raise
+            return path
+
+        meta['checked'] = time.time()
+        write_atomic(path + '.meta.json', json.dumps(meta).encode('utf-8'))
+
+    return path
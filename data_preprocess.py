@@ -1,131 +1,225 @@
-import pandas as pd
-import matplotlib.pyplot as plt
-import pylab
-import numpy as np
-import datetime as dt
-
-import plotly.express as px
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
+import contextlib
+import hashlib
+import os
+import time
 
-import seaborn as sns
-from sklearn.linear_model import LinearRegression
-from sklearn.svm import SVR
+import pandas as pd
 
-from urllib.request import urlopen
-import json
+import anomalies
+import data_cache
+import data_store
 
 url_first_dataset = 'https://raw.githubusercontent.com/owid/covid-19-data/master/public/data/owid-covid-data.csv'
-url_cumulative_bystate = 'https://raw.githubusercontent.com/ynshung/covid-19-malaysia/master/covid-19-my-states-cases.csv'
-
-population_by_state = [255300, 2192800, 1776700, 2510200, 6560900, 1130400, 935600, 3795300, 1683300, 1269700, 1923000, 3912600, 2823300, 1766700, 114900, 99800]
+url_cumulative_bystate = os.environ.get(
+    'COVID_REGIONS_URL',
+    'https://raw.githubusercontent.com/ynshung/covid-19-malaysia/master/covid-19-my-states-cases.csv')
+url_cumulative_my = 'https://raw.githubusercontent.com/wnarifin/covid-19-malaysia/master/covid-19_my.csv'
+url_geojson = os.environ.get(
+    'COVID_GEOJSON_URL',
+    'https://raw.githubusercontent.com/codeforamerica/click_that_hood/master/public/data/malaysia.geojson')
+
+# Region metadata, one row per column of the cumulative-by-region table: key is the column name,
+# geojson_key the properties.name of its map feature (empty when it is not on the map), population
+# and area in km2. Point COVID_REGIONS_TABLE, COVID_REGIONS_URL and COVID_GEOJSON_URL at another set
+# of regions, e.g. districts, to run the dashboard for them
+regions_table = os.environ.get('COVID_REGIONS_TABLE',
+                               os.path.join(os.path.dirname(os.path.abspath(__file__)), 'regions.csv'))
+region_dtypes = {'key': str, 'name': str, 'geojson_key': str, 'population': 'float64', 'area': 'float64'}
+
+# Columns of the OWID dataset used by the dashboard, and the dtypes they are parsed with
+owid_columns = ['iso_code', 'continent', 'location', 'date', 'total_cases', 'new_cases', 'total_deaths', 'new_deaths',
+                'people_vaccinated', 'people_fully_vaccinated', 'stringency_index', 'population']
+owid_dtypes = {'iso_code': str, 'continent': str, 'location': str, 'date': str,
+               'total_cases': 'float64', 'new_cases': 'float64', 'total_deaths': 'float64', 'new_deaths': 'float64',
+               'people_vaccinated': 'float64', 'people_fully_vaccinated': 'float64',
+               'stringency_index': 'float32', 'population': 'float64'}
+owid_chunksize = 100000
+
+# Cumulative OWID columns whose latest value per country makes up data_global
+owid_latest_columns = ['total_cases', 'total_deaths', 'people_vaccinated', 'people_fully_vaccinated', 'population']
+
+# Days before the last date of every country read to find those values. A country with a column not
+# reported within the first window is read again with the next, None reads its whole history
+owid_latest_windows = [30, 365, None]
+
+
+@contextlib.contextmanager
+def timed(timings, phase):
+    start = time.perf_counter()
+    yield
+    timings.append((phase, time.perf_counter() - start))
 
 
 class Data:
     def __init__(self):
-        # First Dataset from url
-        self.df = pd.read_csv(url_first_dataset)
-        self.data = self.get_data_malaysia(self.df)
+        # Seconds spent in each phase of the build, kept as a frame so it is shared with the rest
+        timings = []
+
+        with timed(timings, 'store'):
+            # Bring the local store up to date, only rows newer than the stored ones are parsed
+            manifests = self.update_store()
+
+            # Identifies this build of the data and of the region table, caches derived from it are
+            # keyed on it
+            self.version = self.get_version(manifests, regions_table)
 
-        # Read Data from url into dataframe
-        self.df_cumulative_bystate = pd.read_csv(url_cumulative_bystate)
-        self.df_cumulative_bystate = self.preprocess_data(self.df_cumulative_bystate)
+        with timed(timings, 'owid'):
+            # First Dataset, the Malaysia rows and the latest values of every country
+            malaysia = data_store.load('owid', filters=[('iso_code', '==', 'MYS')])
+            self.data = self.get_data_malaysia(malaysia)
+            self.data_global = self.get_data_global(self.load_latest_by_country())
 
-        # Restructured dataframe
-        self.df_cumulative_restruct = self.restructure_dataframe(self.df_cumulative_bystate)
+        with timed(timings, 'states'):
+            # Name, map key, population and area of every region
+            self.regions = self.load_regions(regions_table)
 
-        # Daily Case by State Dataframe
-        self.df_daily_bystate = self.get_daily_bystate()
+            # Cumulative case by state
+            self.df_cumulative_bystate = data_store.load('states')
+            self.df_cumulative_bystate = self.preprocess_data(self.df_cumulative_bystate)
 
-        # Monthly Case by State Dataframe
-        self.df_monthly_bystate = self.get_monthly_bystate(self.df_daily_bystate)
+            # Restructured dataframe
+            self.df_cumulative_restruct = self.restructure_dataframe(self.df_cumulative_bystate)
 
-        # Dataframe with Population
-        self.df_case_with_pop = self.get_case_with_pop()
+            # Daily Case by State Dataframe
+            self.df_daily_bystate = self.get_daily_bystate()
 
+            # Monthly Case by State Dataframe
+            self.df_monthly_bystate = self.get_monthly_bystate(self.df_daily_bystate)
 
+            # Dataframe with Population
+            self.df_case_with_pop = self.get_case_with_pop()
+
+        with timed(timings, 'national'):
+            # Cumulative cases, deaths and recoveries in Malaysia
+            self.data_cul = self.get_data_cul(data_store.load('my'))
+
+            # Data preparation
+            self.data_second_year = self.data[self.data.date >= '2021-01-01']
+            self.data_forecast = self.data[['date', 'new_cases', 'new_deaths']]
+            # From the rows as reported, self.data has missing values filled with zeros
+            self.data_vaccination = self.get_vaccination_by_date(malaysia[malaysia.date >= '2021-03-02'])
+
+            # Dataset for Pie Chart: Active, Recovery and Deaths
+            self.data_cul_latest = self.get_data_cul_latest()
+
+        self.load_phases = pd.DataFrame(timings, columns=['phase', 'seconds'])
+
+    @classmethod
+    def from_frames(cls, frames, version):
+        # Snapshot made of frames built elsewhere, e.g. attached from shared memory
+        data = cls.__new__(cls)
+        data.__dict__.update(frames)
+        data.version = version
+
+        return data
+
+    def update_store(self):
+        return [
+            data_store.refresh('owid', data_cache.fetch(url_first_dataset), 'date', '%Y-%m-%d', key_column='iso_code',
+                               chunksize=owid_chunksize, usecols=owid_columns, dtype=owid_dtypes),
+            data_store.refresh('states', data_cache.fetch(url_cumulative_bystate), 'date', '%d/%m/%Y', dtype=str),
+            data_store.refresh('my', data_cache.fetch(url_cumulative_my), 'date'),
+        ]
+
+    def get_version(self, manifests, regions_path):
+        stat = os.stat(regions_path)
+        signatures = [manifest['signature'] for manifest in manifests]
+        signatures.append(f'{os.path.abspath(regions_path)}-{stat.st_size}-{stat.st_mtime_ns}')
+        return hashlib.sha1(','.join(signatures).encode('utf-8')).hexdigest()[:12]
+
+    def load_regions(self, path):
+        return pd.read_csv(path, dtype=region_dtypes)
+
+    def load_latest_by_country(self):
+        # Only the last days of every country are read, the countries that left a column out over
+        # those days are read again further back
+        columns = ['iso_code', 'continent', 'location'] + owid_latest_columns
+        found, keys = [], None
+        for days in owid_latest_windows:
+            latest = self.latest_by_country(data_store.load_recent('owid', days, columns, keys))
+            if days is None:
+                found.append(latest)
+                break
+            incomplete = latest.loc[latest[owid_latest_columns].isna().any(axis=1), 'iso_code'].unique()
+            found.append(latest[~latest.iso_code.isin(incomplete)])
+            if not len(incomplete):
+                break
+            keys = incomplete
+
+        return pd.concat(found).sort_values(['iso_code', 'continent', 'location']).reset_index(drop=True)
+
+    def latest_by_country(self, df):
+        # Latest reported value of every cumulative column per country, in one groupby. The store keeps
+        # the rows of a country in date order, and last() skips the days a column was not reported.
+        # Rows without a continent are OWID aggregates such as World or Asia, not countries
+        df = df[df.continent.notna()]
+        return df.groupby(['iso_code', 'continent', 'location'], as_index=False)[owid_latest_columns].last()
+
+    def get_data_global(self, latest):
+        data_global = latest.copy()
+
+        # Per-capita metrics, percentages of the population except deaths per million
+        data_global['index'] = ((data_global['total_cases'] / data_global['population']) * 100)
+        data_global['deaths_per_million'] = data_global['total_deaths'] / data_global['population'] * 1e6
+        data_global['vaccinated_rate'] = data_global['people_vaccinated'] / data_global['population'] * 100
+        data_global['fully_vaccinated_rate'] = (
+                data_global['people_fully_vaccinated'] / data_global['population'] * 100)
+
+        return data_global
 
     def preprocess_data(self, df_cumulative_bystate):
         # Data Preprocessing
         df_cumulative_bystate = df_cumulative_bystate.iloc[3:]
         df_cumulative_bystate = df_cumulative_bystate.replace("-", 0)
-        df_cumulative_bystate['wp-putrajaya'] = df_cumulative_bystate['wp-putrajaya'].astype(int)
-        df_cumulative_bystate.iloc[:, 1:] = df_cumulative_bystate.iloc[:, 1:].astype(int)
+        df_cumulative_bystate['date'] = pd.to_datetime(df_cumulative_bystate['date'], format='%d/%m/%Y')
+        # Assign whole columns so they really become int64 rather than object columns of ints
+        columns = df_cumulative_bystate.columns[1:]
+        df_cumulative_bystate[columns] = df_cumulative_bystate[columns].astype(int)
 
         return df_cumulative_bystate
 
     def extract_year_month(self, df_ori):
         df = df_ori.copy()
-        year_month = []
-        for date in df['date'].values:
-            date_split = date.split("/")
-            result = date_split[2] + "/" + date_split[1]
-            year_month.append(result)
-
-        df['year_month'] = year_month
+        df['year_month'] = df['date'].dt.to_period('M')
 
         return df
 
     def restructure_dataframe(self, df):
-        # Create a copy of dataframe, drop the unused column
-        df_cumulative_restruct = df.copy()
-        df_cumulative_restruct = df_cumulative_restruct.drop(['wp-labuan'], axis=1)
-
-        # Rename and rearrange the column according to that on malaysia geojson file
-        df_cumulative_restruct.columns = ['date', 'Perlis', 'Kedah', 'Penang', 'Perak', 'Selangor', 'Negeri Sembilan',
-                                          'Melaka',
-                                          'Johor', 'Pahang', 'Terengganu', 'Kelantan', 'Sabah', 'Sarawak',
-                                          'Federal Territory of Kuala Lumpur', 'Federal Territory of Putrajaya']
-        df_cumulative_restruct = df_cumulative_restruct[
-            ['date', 'Federal Territory of Kuala Lumpur', 'Perlis', 'Sabah', 'Federal Territory of Putrajaya', 'Kedah',
-             'Sarawak',
-             'Penang', 'Johor', 'Kelantan', 'Melaka', 'Negeri Sembilan', 'Pahang', 'Perak', 'Selangor', 'Terengganu']]
-
-        columns = df_cumulative_restruct.columns
-        df_temp = df_cumulative_restruct[['date', columns[1]]].copy()
-        df_temp.columns = ['date', 'cumulative case']
-        df_temp['state'] = columns[1]
-
-        for i in range(len(columns)):
-            if i == 0 or i == 1:
-                continue
-            else:
-                df2 = df_cumulative_restruct[['date', columns[i]]].copy()
-                df2.columns = ['date', 'cumulative case']
-                df2['state'] = columns[i]
-
-                df_temp = df_temp.append(df2, ignore_index=True)
+        # Keep the regions drawn on the map and name them after their GeoJSON feature
+        geojson_keys = self.regions.dropna(subset=['geojson_key']).set_index('key')['geojson_key']
+        df_cumulative_restruct = df[['date'] + list(df.columns[1:].intersection(geojson_keys.index))]
+        df_cumulative_restruct = df_cumulative_restruct.rename(columns=geojson_keys)
 
-        # Extract the year-month from the date
-        # df_temp['year_month'] = df_temp['date'].dt.to_period('M')
-        # df_temp['year_month'] = df_temp['year_month'].values.astype(str)
+        # One row per date and state, states in column order
+        df_temp = self.wide_to_long(df_cumulative_restruct)
 
         # Extract the year-month from the date
         df_temp = self.extract_year_month(df_temp)
 
         return df_temp
 
-    def get_daily_bystate(self):
-        # Obtain daily case from cumulative dataframe
-        df_daily_bystate = self.df_cumulative_bystate.copy()
-        df_daily_bystate.iloc[:, 1:] = df_daily_bystate.iloc[:, 1:].diff(axis=0)
+    def wide_to_long(self, df):
+        df_long = df.melt(id_vars='date', var_name='state', value_name='cumulative case')
 
-        # Fill null value with 0, and convert the datatype to int
-        df_daily_bystate = df_daily_bystate.fillna(0)
-        df_daily_bystate.iloc[:, 1:] = df_daily_bystate.iloc[:, 1:].astype(int)
+        return df_long[['date', 'cumulative case', 'state']]
 
-        # Handle negative value
-        df_daily_bystate.iloc[298, 14] = 101
-        df_daily_bystate.iloc[64, 15] = 1
+    def get_daily_bystate(self):
+        # Obtain daily case from cumulative dataframe, missing reports, drops in the cumulative count
+        # and outliers are corrected and recorded in self.corrections
+        df_daily_bystate, self.corrections = anomalies.correct(self.df_cumulative_bystate.set_index('date'))
+
+        # Convert the datatype to int
+        df_daily_bystate = df_daily_bystate.astype(int).reset_index()
 
         return df_daily_bystate
 
     def get_case_with_pop(self):
-        # Create Initial Dataframe with population
-        d = {'State': self.df_cumulative_bystate.columns[1:],
+        # Create Initial Dataframe with population, region metadata joined on the column name
+        regions = self.regions.set_index('key').reindex(self.df_cumulative_bystate.columns[1:])
+        d = {'State': regions.index,
              'Cumulative Case': self.df_cumulative_bystate.iloc[-1, 1:].values,
              'Latest Daily Increase': self.df_daily_bystate.iloc[-1, 1:].values,
-             'Population': population_by_state}
+             'Population': regions['population'].values}
         df_case_with_pop = pd.DataFrame(data=d)
 
         # Append the column for cumulative Infected Rate
@@ -133,8 +227,7 @@ class Data:
         df_case_with_pop['Cumulative Infected Rate'] = infected_rate
 
         # Append the column for area size
-        area_size = [821, 9500, 1048, 21035, 8104, 6686, 1664, 19210, 36137, 13035, 15099, 73631, 124450, 243, 49, 91]
-        df_case_with_pop['Area'] = area_size
+        df_case_with_pop['Area'] = regions['area'].values
 
         # Append the column for population density
         pop_density = df_case_with_pop['Population'] / df_case_with_pop['Area']
@@ -150,12 +243,47 @@ class Data:
 
         return data
 
-    def get_monthly_bystate(self, df):
-        df_monthly_bystate = df.copy()
-        df_monthly_bystate = self.extract_year_month(df_monthly_bystate)
+    def get_data_cul(self, data_cul):
+        data_cul['date'] = pd.to_datetime(data_cul['date'])
+
+        return data_cul
+
+    def get_data_cul_latest(self):
+        data_cul_latest = self.data_cul.iloc[-1:][['total_cases', 'total_deaths', 'total_recover']].copy()
+        data_cul_latest['active_cases'] = (
+                data_cul_latest.total_cases - data_cul_latest.total_deaths - data_cul_latest.total_recover)
+        data_cul_latest = data_cul_latest[['active_cases', 'total_deaths', 'total_recover']]
+
+        return data_cul_latest
+
+    def get_vaccination_by_date(self, df):
+        # Values of the vaccination pie chart, one row per day from the first report to the last so
+        # that a date is found by its offset from the first. OWID leaves days out, and leaves either
+        # count out or reports it as zero on some days: each column takes the value of its own
+        # nearest report
+        df = df.assign(date=pd.to_datetime(df['date'])).drop_duplicates('date', keep='last').set_index('date')
+        counts = ['people_vaccinated', 'people_fully_vaccinated']
+        df = df[counts + ['population']].where(lambda values: values > 0)
+        df = df[df[counts].notna().any(axis=1)]
+        # Nothing reported in the range, not even a first day
+        days = pd.date_range(df.index.min(), df.index.max(), freq='D') if len(df) else pd.DatetimeIndex([])
+        df = pd.DataFrame({column: self.nearest_report(df[column], days) for column in df.columns}, index=days)
+
+        return pd.DataFrame({'date': days,
+                             'people_fully_vaccinated': df['people_fully_vaccinated'].to_numpy(),
+                             'unvaccinated': (df['population'] - df['people_vaccinated']).to_numpy(),
+                             '1st_dose_vaccinated':
+                                 (df['people_vaccinated'] - df['people_fully_vaccinated']).to_numpy()})
+
+    def nearest_report(self, values, days):
+        reported = values.dropna()
+        if reported.empty:
+            return pd.Series(0.0, index=days)
+        return reported.reindex(days, method='nearest')
 
-        df_monthly_bystate = df_monthly_bystate.groupby(['year_month'], as_index=False).sum()
+    def get_monthly_bystate(self, df):
+        # Monthly totals, grouped on the Period[M] key so months stay in chronological order
+        df_monthly_bystate = self.extract_year_month(df)
+        df_monthly_bystate = df_monthly_bystate.drop(columns=['date']).groupby(['year_month'], as_index=False).sum()
 
         return df_monthly_bystate
-
-
@@ -0,0 +1,307 @@
+# Local columnar store of the upstream datasets.
+#
+# Each dataset is kept as Parquet files partitioned by month under STORE_DIR/<name>/. A manifest
+# lists the files that make up the dataset, so readers only ever see files that were completely
+# written. On refresh only the rows dated after the last stored date of their key (the country of an
+# OWID row) are written into new files, together with the last revision_days of every key, which
+# upstream still revises. A row written again replaces the stored one with the same key and date
+# when the dataset is loaded or compacted. The whole dataset is rebuilt when its read options change,
+# or when the rows of the source no longer add up to the stored rows plus the new ones, e.g. because
+# rows were removed or backfilled further back than revision_days.
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import time
+import uuid
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+import data_cache
+
+STORE_DIR = os.environ.get('COVID_STORE_DIR',
+                           os.path.join(os.path.dirname(os.path.abspath(__file__)), '.store'))
+
+# Rebuild a dataset into one file per partition once it has more files than this
+max_files_per_partition = 8
+
+# Days before the last stored date of a key that are written again on every refresh
+revision_days = 14
+
+partition_column = 'month'
+row_column = '_row'
+partitioning = ds.partitioning(pa.schema([(partition_column, pa.string())]), flavor='hive')
+
+
+def dataset_dir(name):
+    return os.path.join(STORE_DIR, name)
+
+
+def read_manifest(name):
+    try:
+        with open(os.path.join(dataset_dir(name), 'manifest.json')) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_manifest(name, manifest):
+    data_cache.write_atomic(os.path.join(dataset_dir(name), 'manifest.json'),
+                            json.dumps(manifest, indent=1).encode('utf-8'))
+
+
+def options_key(date_column, date_format, key_column, read_kwargs):
+    return hashlib.sha1(repr((date_column, date_format, key_column,
+                              sorted(read_kwargs.items()))).encode('utf-8')).hexdigest()
+
+
+def record_batches(path, schema, date_column, date_format, key_column, last_dates, first_row, progress, chunksize,
+                   read_kwargs):
+    # Parse the CSV and yield the rows newer than the last stored date of their key and those within
+    # revision_days of it, tagged with their partition and row number. Rows of a key not stored yet
+    # are all new
+    if chunksize:
+        chunks = pd.read_csv(path, chunksize=chunksize, **read_kwargs)
+    else:
+        chunks = [pd.read_csv(path, **read_kwargs)]
+    stored = pd.Series({key: pd.Timestamp(date) for key, date in last_dates.items()}, dtype='datetime64[ns]')
+
+    for chunk in chunks:
+        dates = pd.to_datetime(chunk[date_column], format=date_format, errors='coerce').values
+        keys = chunk[key_column].fillna('').astype(str).values if key_column else np.full(len(chunk), '')
+        last = pd.Series(keys).map(stored).values
+        known = ~pd.isna(last)
+        valid = ~pd.isna(dates)
+
+        new = valid & (~known | (dates > last))
+        keep = ~known | (dates > last - np.timedelta64(revision_days, 'D'))
+        progress['source_rows'] += int(valid.sum())
+        progress['new_rows'] += int(new.sum())
+        progress['revised_rows'] += int((keep & ~new & valid).sum())
+
+        chunk, dates, keys = chunk[keep], dates[keep], keys[keep]
+        if chunk.empty:
+            continue
+
+        valid = ~pd.isna(dates)
+        for key, date in pd.Series(dates[valid]).groupby(keys[valid]).max().items():
+            if key not in progress['last_dates'] or date > progress['last_dates'][key]:
+                progress['last_dates'][key] = date
+
+        chunk = chunk.assign(**{row_column: np.arange(first_row + progress['rows'],
+                                                      first_row + progress['rows'] + len(chunk)),
+                                partition_column: pd.Series(dates).dt.strftime('%Y-%m').fillna('unknown').values})
+        progress['rows'] += len(chunk)
+
+        if schema is None:
+            schema = pa.Schema.from_pandas(chunk, preserve_index=False)
+            progress['schema'] = schema
+        yield pa.RecordBatch.from_pandas(chunk, schema=schema, preserve_index=False)
+
+
+def write_files(name, generation, batches, schema):
+    # Write into a scratch directory, then move each finished file into the generation directory
+    generation_dir = os.path.join(dataset_dir(name), generation)
+    scratch_dir = os.path.join(dataset_dir(name), '.tmp-' + uuid.uuid4().hex)
+    written = []
+    try:
+        ds.write_dataset(batches, scratch_dir, schema=schema, format='parquet', partitioning=partitioning,
+                         basename_template=uuid.uuid4().hex + '-{i}.parquet',
+                         file_visitor=lambda f: written.append(os.path.relpath(f.path, scratch_dir)))
+        for relative_path in written:
+            os.makedirs(os.path.dirname(os.path.join(generation_dir, relative_path)), exist_ok=True)
+            os.replace(os.path.join(scratch_dir, relative_path), os.path.join(generation_dir, relative_path))
+    finally:
+        shutil.rmtree(scratch_dir, ignore_errors=True)
+
+    return [os.path.join(generation, f) for f in written]
+
+
+def refresh(name, path, date_column, date_format=None, chunksize=None, key_column=None, **read_kwargs):
+    """Bring dataset name up to date with the CSV at path, appending only new and revised rows.
+
+    key_column names the column that, with the date, identifies a row, e.g. the country of a dataset
+    holding one row per country and day. Without it the date alone does.
+    """
+    os.makedirs(dataset_dir(name), exist_ok=True)
+
+    with open(dataset_dir(name) + '.lock', 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+
+        stat = os.stat(path)
+        signature = f'{stat.st_size}-{stat.st_mtime_ns}'
+        options = options_key(date_column, date_format, key_column, read_kwargs)
+
+        manifest = read_manifest(name)
+        if manifest is not None and manifest['signature'] == signature and manifest['options'] == options:
+            return manifest
+
+        if manifest is not None and manifest['options'] == options:
+            manifest = ingest(name, path, manifest, date_column, date_format, key_column, chunksize, read_kwargs)
+        if manifest is None or manifest['options'] != options:
+            # Full build into a fresh generation
+            manifest = ingest(name, path, None, date_column, date_format, key_column, chunksize, read_kwargs)
+
+        manifest.update(signature=signature, options=options, updated=time.time())
+        write_manifest(name, manifest)
+
+        partitions = {os.path.dirname(f) for f in manifest['files']}
+        if len(manifest['files']) > max_files_per_partition * max(len(partitions), 1):
+            manifest = compact(name, manifest)
+
+    return manifest
+
+
+def ingest(name, path, manifest, date_column, date_format, key_column, chunksize, read_kwargs):
+    # Write the rows of path missing from the dataset of manifest, or all of them into a new generation
+    # without one. Returns the updated manifest, or None when the source does not add up to the stored
+    # rows and has to be ingested in full
+    if manifest is None:
+        manifest = {'generation': uuid.uuid4().hex[:12], 'files': [], 'rows': 0, 'distinct_rows': 0,
+                    'last_dates': {}, 'date_column': date_column, 'date_format': date_format,
+                    'key_column': key_column, 'revised': False}
+        schema = None
+    else:
+        manifest = dict(manifest)
+        schema = pq.read_schema(os.path.join(dataset_dir(name), manifest['files'][0]))
+        schema = schema.append(pa.field(partition_column, pa.string()))
+
+    progress = {'rows': 0, 'source_rows': 0, 'new_rows': 0, 'revised_rows': 0, 'schema': schema,
+                'last_dates': {key: pd.Timestamp(date) for key, date in manifest['last_dates'].items()}}
+    batches = record_batches(path, schema, date_column, date_format, key_column, manifest['last_dates'],
+                             manifest['rows'], progress, chunksize, read_kwargs)
+
+    # The schema of a new dataset is only known once the first batch is parsed
+    first = next(batches, None)
+    files = []
+    if first is not None:
+        def all_batches():
+            yield first
+            yield from batches
+
+        files = write_files(name, manifest['generation'], all_batches(), progress['schema'])
+
+    distinct_rows = manifest['distinct_rows'] + progress['new_rows']
+    if manifest['files'] and distinct_rows != progress['source_rows']:
+        # Rows were removed or backfilled before the revision window. No manifest lists the files just
+        # written, so no reader has them open
+        for f in files:
+            os.remove(os.path.join(dataset_dir(name), f))
+        return None
+
+    manifest['files'] = manifest['files'] + files
+    manifest['rows'] += progress['rows']
+    manifest['distinct_rows'] = distinct_rows
+    manifest['last_dates'] = {key: date.isoformat() for key, date in progress['last_dates'].items()}
+    manifest['revised'] = manifest['revised'] or progress['revised_rows'] > 0
+
+    return manifest
+
+
+def latest_rows(df, manifest):
+    # Drop the rows written again since, keeping the last written row of each key and date
+    if not manifest.get('revised'):
+        return df
+    subset = [c for c in (manifest['key_column'], manifest['date_column']) if c]
+    return df.sort_values(row_column, kind='stable').drop_duplicates(subset, keep='last')
+
+
+def compact(name, manifest):
+    # Rewrite the dataset into a new generation with one file per partition, without the rows that
+    # were written again since
+    dataset = open_dataset(name, manifest)
+    generation = uuid.uuid4().hex[:12]
+    if manifest.get('revised'):
+        df = latest_rows(dataset.to_table().to_pandas(), manifest)
+        batches = pa.Table.from_pandas(df, schema=dataset.schema, preserve_index=False).to_batches()
+    else:
+        batches = dataset.scanner().to_batches()
+    files = write_files(name, generation, batches, dataset.schema)
+
+    previous = manifest['generation']
+    manifest = dict(manifest, generation=generation, files=files, revised=False, updated=time.time())
+    write_manifest(name, manifest)
+
+    # Keep the previous generation around for readers that still hold the old manifest
+    for entry in os.listdir(dataset_dir(name)):
+        if entry not in (generation, previous, 'manifest.json') and not entry.startswith('.'):
+            shutil.rmtree(os.path.join(dataset_dir(name), entry), ignore_errors=True)
+
+    return manifest
+
+
+def open_dataset(name, manifest=None):
+    manifest = manifest or read_manifest(name)
+    if manifest is None:
+        raise FileNotFoundError(f'dataset {name!r} has not been ingested into {STORE_DIR}')
+    generation_dir = os.path.join(dataset_dir(name), manifest['generation'])
+    return ds.dataset([os.path.join(dataset_dir(name), f) for f in manifest['files']], format='parquet',
+                      partitioning=partitioning, partition_base_dir=generation_dir)
+
+
+def load(name, columns=None, filters=None):
+    """Read dataset name as a DataFrame in source row order.
+
+    columns restricts the columns read from disk and filters, given in the pyarrow.parquet DNF form
+    e.g. [('iso_code', '==', 'MYS')], is pushed down to skip row groups and partitions.
+    """
+    expression = pq.filters_to_expression(filters) if filters else None
+    return read(name, read_manifest(name), columns, expression)
+
+
+def load_recent(name, days, columns=None, keys=None):
+    """Read the rows of dataset name dated within days of the last stored date of their key.
+
+    keys restricts the rows read to those keys, with days None all their rows are read. Whole months
+    before the cutoff of a key are skipped on disk, the earlier days of its cutoff month once read.
+    """
+    manifest = read_manifest(name)
+    key_column, date_column = manifest.get('key_column'), manifest['date_column']
+    last_dates = pd.Series(manifest['last_dates'], dtype=object)
+    if keys is not None:
+        last_dates = last_dates[last_dates.index.isin(list(keys))]
+    if last_dates.empty:
+        return read(name, manifest, columns, pc.scalar(False))
+
+    expression = None
+    if days is not None:
+        cutoffs = pd.to_datetime(last_dates) - pd.Timedelta(days=days)
+        for month, group in cutoffs.groupby(cutoffs.dt.strftime('%Y-%m')):
+            term = ds.field(partition_column) >= month
+            if key_column:
+                term = term & ds.field(key_column).isin(list(group.index))
+            expression = term if expression is None else expression | term
+    elif keys is not None and key_column:
+        expression = ds.field(key_column).isin(list(last_dates.index))
+
+    extra = [c for c in (key_column, date_column) if c and columns is not None and c not in columns]
+    df = read(name, manifest, None if columns is None else list(columns) + extra, expression)
+    if days is not None:
+        dates = pd.to_datetime(df[date_column], format=manifest.get('date_format'), errors='coerce')
+        cutoff = df[key_column].map(cutoffs) if key_column else cutoffs.iloc[0]
+        df = df[dates > cutoff].reset_index(drop=True)
+
+    return df.drop(columns=extra)
+
+
+def read(name, manifest, columns, expression):
+    dataset = open_dataset(name, manifest)
+    if columns is not None:
+        # The key and date identify the revised rows, they are read even when not asked for
+        identity = [c for c in (manifest.get('key_column'), manifest.get('date_column'))
+                    if c and manifest.get('revised') and c not in columns]
+        columns = list(columns) + identity + [row_column]
+    else:
+        identity = []
+        columns = [c for c in dataset.schema.names if c != partition_column]
+
+    df = latest_rows(dataset.to_table(columns=columns, filter=expression).to_pandas(), manifest)
+    df = df.sort_values(row_column, kind='stable').drop(columns=[row_column] + identity).reset_index(drop=True)
+
+    return df
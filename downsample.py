@@ -0,0 +1,70 @@
+# Time series cut to the visible date range and downsampled to the width of the chart.
+#
+# Largest-Triangle-Three-Buckets keeps, from every bucket of consecutive days, the point forming
+# the largest triangle with the point kept before it and the mean of the next bucket. Peaks and
+# troughs survive while the figure holds about one point per pixel however long the history is,
+# and zooming in asks for the narrower range again at full detail.
+import numpy as np
+import pandas as pd
+
+# Widths are rounded up to a multiple of this so nearby widths share cached figures
+width_step = 100
+default_width = 1200
+max_width = 4000
+
+
+def points_for(width):
+    width = default_width if not width else min(max(int(width), width_step), max_width)
+    return -(-width // width_step) * width_step
+
+
+def visible(dates, start=None, end=None):
+    # Slice of the sorted dates within [start, end], plus one day either side so the line reaches
+    # the edges of the plot
+    first, last = 0, len(dates)
+    if start is not None:
+        first = max(np.searchsorted(dates, pd.Timestamp(start).to_datetime64(), side='left') - 1, 0)
+    if end is not None:
+        last = min(np.searchsorted(dates, pd.Timestamp(end).to_datetime64(), side='right') + 1, len(dates))
+    return slice(first, last)
+
+
+def lttb(x, y, threshold):
+    # Indices of the threshold points of (x, y) to keep, first and last always among them
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    # threshold - 2 buckets over the points between the first and the last
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)
+    selected = np.empty(threshold, dtype=int)
+    selected[0], selected[-1] = 0, n - 1
+
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        if i + 2 < len(edges):
+            next_x, next_y = x[end:edges[i + 2]].mean(), y[end:edges[i + 2]].mean()
+        else:
+            next_x, next_y = x[n - 1], y[n - 1]
+        area = np.abs((x[a] - next_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (next_y - y[a]))
+        a = start + int(np.argmax(area))
+        selected[i + 1] = a
+
+    return selected
+
+
+def series(dates, values, start=None, end=None, width=None):
+    # Dates and values of one trace for a plot width pixels wide showing [start, end]
+    dates = np.asarray(dates, dtype='datetime64[ns]')
+    values = np.asarray(values, dtype=float)
+    window = visible(dates, start, end)
+    dates, values = dates[window], values[window]
+
+    # Leading days of rolling statistics and undefined ratios are not drawn anyway
+    finite = np.isfinite(values)
+    if not finite.all():
+        dates, values = dates[finite], values[finite]
+
+    keep = lttb(dates.astype('int64').astype(float), values, points_for(width))
+    return dates[keep], values[keep]
@@ -0,0 +1,133 @@
+# Memoized figures for the Dash callbacks.
+#
+# Figures are keyed on the callback name, its input values and the version of the data they were
+# built from, and kept as plain JSON-compatible dicts so a hit costs no Plotly work at all. Builders
+# return a go.Figure or a plain_figure dict. The input domain of each callback can be registered so
+# the whole cache can be warmed up front.
+#
+# RenderStats counts, per figure, how often it was asked for and how often a request had it built,
+# against the number of page views. A figure that does not depend on a toggle shows no renders when
+# the toggle is used, and a figure built once per data version shows no renders at all: builds ahead
+# of requests, warming the cache after a swap, are counted apart as warm renders. Counts are per
+# process, so per gunicorn worker.
+import collections
+import functools
+import threading
+
+import plain_figure
+
+
+def freeze(value):
+    # Callback inputs arrive as JSON values, lists have to become tuples to be hashable
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(v) for v in value)
+    if isinstance(value, dict):
+        return tuple(sorted((k, freeze(v)) for k, v in value.items()))
+    return value
+
+
+def to_plain(figure):
+    return plain_figure.loads(plain_figure.to_json(figure))
+
+
+class RenderStats:
+    def __init__(self):
+        self.page_views = 0
+        self.requests = collections.Counter()
+        self.renders = collections.Counter()
+        self.warm_renders = collections.Counter()
+        self.lock = threading.Lock()
+
+    def page_view(self):
+        with self.lock:
+            self.page_views += 1
+
+    def count(self, name, rendered, requested=True):
+        with self.lock:
+            if requested:
+                self.requests[name] += 1
+                self.renders[name] += rendered
+            else:
+                self.warm_renders[name] += rendered
+
+    def report(self):
+        with self.lock:
+            page_views = self.page_views
+            figures = {name: {'requests': self.requests[name], 'renders': self.renders[name],
+                              'warm_renders': self.warm_renders[name],
+                              'renders_per_page_view': self.renders[name] / page_views if page_views else None}
+                       for name in self.requests | self.renders | self.warm_renders}
+        return {'page_views': page_views, 'figures': figures}
+
+
+class FigureCache:
+    def __init__(self, maxsize=256, stats=None):
+        self.maxsize = maxsize
+        self.stats = stats if stats is not None else RenderStats()
+        self.version = None
+        self.entries = collections.OrderedDict()
+        self.builders = {}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def memoize(self, name, domain=None):
+        # domain: callable returning the argument tuples to build when warming
+        def decorator(func):
+            self.builders[name] = (func, domain)
+
+            @functools.wraps(func)
+            def wrapper(*args):
+                return self.get(name, args)
+
+            return wrapper
+
+        return decorator
+
+    def get(self, name, args, requested=True):
+        func, domain = self.builders[name]
+        key = (name, self.version, freeze(args))
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                figure = self.entries[key]
+            else:
+                figure = None
+                self.misses += 1
+        self.stats.count(name, rendered=figure is None, requested=requested)
+        if figure is not None:
+            return figure
+
+        figure = to_plain(func(*args))
+
+        with self.lock:
+            # Only keep it if the data did not change while the figure was being built
+            if key[1] == self.version:
+                self.entries[key] = figure
+                while len(self.entries) > self.maxsize:
+                    self.entries.popitem(last=False)
+
+        return figure
+
+    def set_version(self, version):
+        with self.lock:
+            if version != self.version:
+                self.version = version
+                self.entries.clear()
+
+    def warm(self):
+        for name, (func, domain) in list(self.builders.items()):
+            if domain is None:
+                continue
+            for args in domain():
+                try:
+                    self.get(name, tuple(args), requested=False)
+                except Exception:
+                    # Warming is best effort, the failure surfaces again on the real request
+                    continue
+
+    def warm_in_background(self):
+        thread = threading.Thread(target=self.warm, name='figure-cache-warm', daemon=True)
+        thread.start()
+        return thread
@@ -0,0 +1,231 @@
+# Forecasts of daily cases and deaths.
+#
+# Every registered model is fitted to every series (national cases and deaths, daily cases of each
+# state) in a process pool whenever a new snapshot comes in. A fit predicts the whole forecast
+# horizon up front, so answering a request is a lookup and never fits anything on the request
+# thread. Results are published per data version as a whole, like the snapshots themselves.
+#
+# With a shared snapshot (see shared_data.py) the loader process fits once per version and writes
+# the fits next to the snapshot, as the frame returned by Forecaster.frame(). The workers' forecasters
+# are given a fits source reading them, and only load the fits instead of each running the pool. A
+# worker that has not found the fits of a version after fits_timeout fits them itself.
+#
+# A model is a Model subclass with a name and a label, fit(values) taking the daily values oldest
+# first and returning the model, and predict(horizon) returning that many daily values. Register it
+# with @register to have it fitted and offered in the dashboard.
+import abc
+import concurrent.futures
+import logging
+import multiprocessing
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+forecast_horizon = int(os.environ.get('COVID_FORECAST_HORIZON', 60))
+forecast_workers = int(os.environ.get('COVID_FORECAST_WORKERS', 2))
+
+# Seconds between looks for the fits of a new version, when they are made elsewhere, and seconds
+# after which a worker gives up waiting and fits the version itself, e.g. when the loader died
+fits_poll_interval = 5
+fits_timeout = int(os.environ.get('COVID_FORECAST_FITS_TIMEOUT', 900))
+
+forecast_columns = ['model', 'region', 'metric', 'date', 'value']
+
+logger = logging.getLogger(__name__)
+
+models = {}
+
+
+def register(cls):
+    models[cls.name] = cls
+    return cls
+
+
+class Model(abc.ABC):
+    name = None
+    label = None
+
+    @abc.abstractmethod
+    def fit(self, values):
+        pass
+
+    @abc.abstractmethod
+    def predict(self, horizon):
+        pass
+
+
+@register
+class RollingLinear(Model):
+    # Straight line through the last few weeks
+    name = 'rolling-linear'
+    label = 'Rolling linear trend'
+
+    def __init__(self, window=28):
+        self.window = window
+
+    def fit(self, values):
+        from sklearn.linear_model import LinearRegression
+
+        recent = np.asarray(values[-self.window:], dtype=float)
+        self.start = len(recent)
+        self.regression = LinearRegression().fit(np.arange(self.start).reshape(-1, 1), recent)
+        return self
+
+    def predict(self, horizon):
+        days = np.arange(self.start, self.start + horizon).reshape(-1, 1)
+        return np.clip(self.regression.predict(days), 0, None)
+
+
+@register
+class LaggedSVR(Model):
+    # Support vector regression of a day on the days before it, predicted one day at a time
+    name = 'lagged-svr'
+    label = 'SVR on lagged days'
+
+    def __init__(self, lags=14, window=180, C=10.0, epsilon=0.01):
+        self.lags = lags
+        self.window = window
+        self.C = C
+        self.epsilon = epsilon
+
+    def fit(self, values):
+        from sklearn.svm import SVR
+
+        # log1p scaled to the window maximum, so one set of hyperparameters suits every series
+        series = np.log1p(np.clip(np.asarray(values[-self.window:], dtype=float), 0, None))
+        if len(series) < self.lags + 2:
+            raise ValueError(f'{self.name} needs at least {self.lags + 2} days, got {len(series)}')
+        self.scale = series.max() or 1.0
+        series = series / self.scale
+
+        features = np.lib.stride_tricks.sliding_window_view(series[:-1], self.lags)
+        self.svr = SVR(C=self.C, epsilon=self.epsilon).fit(features, series[self.lags:])
+        self.history = series[-self.lags:]
+        return self
+
+    def predict(self, horizon):
+        history = list(self.history)
+        for _ in range(horizon):
+            history.append(self.svr.predict(np.array([history[-self.lags:]]))[0])
+        return np.clip(np.expm1(np.array(history[self.lags:]) * self.scale), 0, None)
+
+
+def fit_forecast(model_name, values, horizon):
+    # Runs in the pool, only the predictions travel back
+    return models[model_name]().fit(values).predict(horizon)
+
+
+def daily_series(Data):
+    # (region, metric) -> daily values indexed by date
+    national = Data.data_forecast.set_index('date')
+    series = {('Malaysia', 'new_cases'): national['new_cases'], ('Malaysia', 'new_deaths'): national['new_deaths']}
+    by_state = Data.df_daily_bystate.set_index('date')
+    for state in by_state.columns:
+        series[(state, 'new_cases')] = by_state[state]
+
+    return series
+
+
+class Forecaster:
+    def __init__(self, horizon=forecast_horizon, max_workers=forecast_workers, fits=None):
+        # fits: callable taking a data version and returning its fits as a frame (see frame()), or
+        # None while they are not made yet. With it nothing is fitted here, unless they are not made
+        # within fits_timeout
+        self.horizon = horizon
+        self.max_workers = max_workers
+        self.fits = fits
+        self.version = None
+        self.requested = None
+        self.forecasts = {}
+        self.lock = threading.Lock()
+
+    def request(self, version):
+        # False when that version is already published or on its way
+        with self.lock:
+            if version in (self.version, self.requested):
+                return False
+            self.requested = version
+            return True
+
+    def publish(self, version, forecasts):
+        with self.lock:
+            # A newer snapshot may have come in while these were made
+            if self.requested == version:
+                self.forecasts = forecasts
+                self.version = version
+
+    def fit(self, Data):
+        if not self.request(Data.version):
+            return
+        self.publish(Data.version, self.fit_all(Data))
+
+    def fit_all(self, Data):
+        series = daily_series(Data)
+        forecasts = {}
+        # Spawned workers start clean, forking a process that runs threads is not safe. The pool only
+        # lives for one round of fits so idle workers do not hold on to scikit-learn
+        context = multiprocessing.get_context('spawn')
+        with concurrent.futures.ProcessPoolExecutor(self.max_workers, mp_context=context) as pool:
+            futures = {}
+            for (region, metric), values in series.items():
+                for name in models:
+                    future = pool.submit(fit_forecast, name, values.to_numpy(dtype=float), self.horizon)
+                    futures[future] = (name, region, metric, values.index[-1])
+
+            for future in concurrent.futures.as_completed(futures):
+                name, region, metric, last_date = futures[future]
+                try:
+                    predictions = future.result()
+                except Exception:
+                    logger.exception('%s forecast of %s %s failed', name, region, metric)
+                    continue
+                dates = pd.date_range(last_date + pd.Timedelta(days=1), periods=len(predictions))
+                forecasts[(name, region, metric)] = pd.Series(predictions, index=dates)
+
+        return forecasts
+
+    def load(self, Data):
+        # Wait for the fits of this version to be made elsewhere, until a newer version is requested or
+        # fits_timeout has passed
+        if not self.request(Data.version):
+            return
+        deadline = time.monotonic() + fits_timeout
+        while self.requested == Data.version:
+            frame = self.fits(Data.version)
+            if frame is not None:
+                self.publish(Data.version, self.from_frame(frame))
+                return
+            if time.monotonic() >= deadline:
+                logger.warning('no forecasts of data version %s after %s s, fitting them here',
+                               Data.version, fits_timeout)
+                self.publish(Data.version, self.fit_all(Data))
+                return
+            time.sleep(fits_poll_interval)
+
+    def update_in_background(self, Data):
+        target = self.load if self.fits is not None else self.fit
+        thread = threading.Thread(target=target, args=(Data,), name='forecast-update', daemon=True)
+        thread.start()
+        return thread
+
+    def frame(self):
+        # The published forecasts as one long frame
+        with self.lock:
+            forecasts = self.forecasts
+        return pd.DataFrame([(model, region, metric, date, value)
+                             for (model, region, metric), forecast in forecasts.items()
+                             for date, value in forecast.items()], columns=forecast_columns)
+
+    def from_frame(self, frame):
+        return {key: pd.Series(group['value'].to_numpy(), index=pd.DatetimeIndex(group['date']))
+                for key, group in frame.groupby(['model', 'region', 'metric'], sort=False)}
+
+    def get(self, model, region, metric, until):
+        # Daily predictions up to and including the date `until`, None while no fit is available
+        forecast = self.forecasts.get((model, region, metric))
+        if forecast is None:
+            return None
+        return forecast[:until]
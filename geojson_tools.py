@@ -0,0 +1,145 @@
+# Preprocessing of the Malaysia GeoJSON before it is embedded in a figure.
+#
+# The upstream file carries full-resolution coordinates and several properties per feature, while
+# the choropleth only matches features on properties.name. Coordinates are quantized first, then
+# every ring is cut into arcs at the points where its neighbours change. Each arc is simplified
+# once with Douglas-Peucker and reused by every ring that shares it, so state borders still meet.
+import os
+
+import numpy as np
+
+geojson_tolerance = float(os.environ.get('GEOJSON_TOLERANCE', 0.005))
+geojson_precision = int(os.environ.get('GEOJSON_PRECISION', 3))
+geojson_properties = ['name']
+
+
+def polygons(geometry):
+    if geometry['type'] == 'Polygon':
+        return [geometry['coordinates']]
+    if geometry['type'] == 'MultiPolygon':
+        return geometry['coordinates']
+    raise ValueError(f"unsupported geometry type {geometry['type']!r}")
+
+
+def quantize_ring(ring, precision):
+    # Open ring of rounded points without consecutive duplicates
+    points = []
+    for x, y in (c[:2] for c in ring):
+        point = (round(x, precision), round(y, precision))
+        if not points or points[-1] != point:
+            points.append(point)
+    if len(points) > 1 and points[0] == points[-1]:
+        points.pop()
+
+    return points
+
+
+def douglas_peucker(points, tolerance):
+    points = np.asarray(points, dtype=float)
+    keep = np.zeros(len(points), dtype=bool)
+    keep[[0, -1]] = True
+
+    stack = [(0, len(points) - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        start, end = points[first], points[last]
+        segment = end - start
+        inner = points[first + 1:last] - start
+        length = np.hypot(*segment)
+        if length == 0:
+            distances = np.hypot(inner[:, 0], inner[:, 1])
+        else:
+            distances = np.abs(segment[0] * inner[:, 1] - segment[1] * inner[:, 0]) / length
+        index = int(np.argmax(distances))
+        if distances[index] > tolerance:
+            split = first + 1 + index
+            keep[split] = True
+            stack.append((first, split))
+            stack.append((split, last))
+
+    return [tuple(p) for p in points[keep].tolist()]
+
+
+def split_arcs(ring, owners):
+    # Cut a ring at every point whose set of owning rings differs from a neighbour's
+    n = len(ring)
+    junctions = [i for i in range(n)
+                 if owners[ring[i]] != owners[ring[i - 1]] or owners[ring[i]] != owners[ring[(i + 1) % n]]]
+    if not junctions:
+        # A ring shared with nobody, cut it at the point farthest from its start
+        points = np.asarray(ring)
+        far = int(np.argmax(np.hypot(*(points - points[0]).T)))
+        junctions = [0, far] if far else [0]
+
+    arcs = []
+    for j, start in enumerate(junctions):
+        end = junctions[(j + 1) % len(junctions)]
+        if end > start:
+            arcs.append(ring[start:end + 1])
+        else:
+            arcs.append(ring[start:] + ring[:end + 1])
+
+    return arcs
+
+
+def simplify_rings(rings, tolerance):
+    owners = {}
+    for ring_id, ring in enumerate(rings):
+        for point in ring:
+            owners.setdefault(point, set()).add(ring_id)
+    owners = {point: frozenset(ids) for point, ids in owners.items()}
+
+    # Shared arcs are simplified once, in a canonical direction
+    simplified_arcs = {}
+    simplified = []
+    for ring in rings:
+        if len(ring) < 3:
+            simplified.append(ring)
+            continue
+
+        result = []
+        for arc in split_arcs(ring, owners):
+            key = min(tuple(arc), tuple(reversed(arc)))
+            if key not in simplified_arcs:
+                simplified_arcs[key] = douglas_peucker(key, tolerance)
+            arc = simplified_arcs[key] if key == tuple(arc) else simplified_arcs[key][::-1]
+            result.extend(arc[:-1])
+
+        # Keep the quantized ring when simplification would collapse it
+        simplified.append(result if len(result) >= 3 else ring)
+
+    return simplified
+
+
+def prepare(geojson, tolerance=geojson_tolerance, precision=geojson_precision, properties=geojson_properties):
+    # Quantize every ring of every feature, remembering where each ring belongs
+    rings = []
+    shapes = []
+    for feature in geojson['features']:
+        shape = []
+        for polygon in polygons(feature['geometry']):
+            shape.append([])
+            for ring in polygon:
+                shape[-1].append(len(rings))
+                rings.append(quantize_ring(ring, precision))
+        shapes.append(shape)
+
+    if tolerance > 0:
+        rings = simplify_rings(rings, tolerance)
+
+    features = []
+    for feature, shape in zip(geojson['features'], shapes):
+        coordinates = [[[list(p) for p in rings[i] + rings[i][:1]] for i in polygon] for polygon in shape]
+        if feature['geometry']['type'] == 'Polygon':
+            geometry = {'type': 'Polygon', 'coordinates': coordinates[0]}
+        else:
+            geometry = {'type': 'MultiPolygon', 'coordinates': coordinates}
+        features.append({
+            'type': 'Feature',
+            'properties': {key: feature['properties'][key] for key in properties},
+            'geometry': geometry,
+        })
+
+    return {'type': 'FeatureCollection', 'features': features}
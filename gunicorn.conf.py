@@ -0,0 +1,18 @@
+# Gunicorn settings, read automatically from the working directory.
+#
+# When COVID_SHARED_DATA_DIR is set the master starts the data loader before forking any worker,
+# and the workers attach to the snapshot it exports instead of each loading the data.
+import shared_data
+
+
+def on_starting(server):
+    if shared_data.shared_data_dir:
+        server.log.info('starting data loader, exporting to %s', shared_data.shared_data_dir)
+        server.data_loader = shared_data.start_loader(shared_data.shared_data_dir)
+
+
+def on_exit(server):
+    loader = getattr(server, 'data_loader', None)
+    if loader is not None:
+        loader.terminate()
+        loader.wait()
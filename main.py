@@ -1,363 +1,463 @@
 # Import libraries
-from datetime import date
+from datetime import date, timedelta
+import functools
 import dash
 import dash_html_components as html
 import dash_core_components as dcc
-from dash.dependencies import Input, Output
-import pandas as pd
-import seaborn as sns
-import matplotlib.pyplot as plt
-import plotly.tools as tls
-import plotly.express as px
+from dash.dependencies import ClientsideFunction, Input, Output, State
+from dash.exceptions import PreventUpdate
+import flask
+import plotly.colors
 import plotly.graph_objects as go
-from plotly.subplots import make_subplots
+import plotly.utils
+import itertools
 import json
+import numpy as np
 
+import data_cache
 import data_preprocess
-from urllib.request import urlopen
+import downsample
+import figure_cache
+import forecasting
+import geojson_tools
+import metrics
+import plain_figure
+import ranking
+import refresher
+import regression
+import rolling_stats
+import shared_data
+import static_figures
+import theme
 
-Data = data_preprocess.Data()
-with urlopen(
-        'https://raw.githubusercontent.com/codeforamerica/click_that_hood/master/public/data/malaysia.geojson') as response:
-    mysgeojson = json.load(response)
 # Stylesheet
 external_stylesheets = ['https://codepen.io/chriddyp/pen/bWLwgP.css']
 
-# Read the dataset
-# df = pd.read_csv('https://raw.githubusercontent.com/owid/covid-19-data/master/public/data/owid-covid-data.csv')
-data_cul = pd.read_csv('https://raw.githubusercontent.com/wnarifin/covid-19-malaysia/master/covid-19_my.csv')
-
-states = Data.df_monthly_bystate.columns[1:]
-
-# Data Cleaning, extract Malaysia Dataset
-# data = df[df.iso_code == 'MYS']
-
-# Fill NaN with zero
-# data.isna().values.any()
-# data = data.fillna(0)
-
-# Convert datetime
-# data['date'] = pd.to_datetime(data['date'])
-data_cul.date = pd.to_datetime(data_cul['date'])
-
-# Data preparation
-data_second_year = Data.data[Data.data.date >= '2021-01-01']
-data_forecast = Data.data[['date', 'total_cases']]
-data_vaccination = Data.data[Data.data.date >= '2021-03-02']
-
-# Dataset for Regression with Seaborn
-regplot_fig = plt.figure()
-with sns.axes_style('darkgrid'):
-    ax = sns.regplot(data=data_second_year,
-                     x='new_cases',
-                     y='new_deaths',
-                     color='#2f4b7c',
-                     scatter_kws={'alpha': 0.3, 'color': '#DBE6FD'},
-                     line_kws={'color': '#ff7c43'})
-
-    ax.set(ylim=(0, 150),
-           xlim=(data_second_year.new_cases.min() - 100, 10000),
-           ylabel='Daily Deaths',
-           xlabel='Daily Confirmed Cases')
-regplot_fig_url = tls.mpl_to_plotly(regplot_fig)
-regplot_fig_url.update_layout(
-    plot_bgcolor='#47597E',
-    paper_bgcolor='#47597E',
-    hovermode='closest',
-    width=500,
-    height=400,
-    xaxis=dict(
-        title='<b>Daily Deaths</b>',
-        color='white',
-        showline=True,
-        showgrid=True,
-        showticklabels=True,
-        linecolor='white',
-        linewidth=2,
-        ticks='outside',
-        tickfont=dict(
-            family='Arial',
-            size=11,
-            color='white'
-        )
-    ),
-    yaxis=dict(
-        title='<b>Daily Cases</b>',
-        color='white',
-        showline=True,
-        showgrid=True,
-        showticklabels=True,
-        linecolor='white',
-        linewidth=2,
-        ticks='outside',
-        tickfont=dict(
-            family='Arial',
-            size=11,
-            color='white'
-        )
-    ),
-    font=dict(
-        family='sans-serif',
-        size=11,
-        color='white'
-    )
-)
 
-# Dataset for Pie Chart: Active, Recovery and Deaths
-data_cul_latest = data_cul.iloc[-1:]
-data_cul_latest = data_cul_latest[['total_cases', 'total_deaths', 'total_recover']]
-data_cul_latest['active_cases'] = (
-        data_cul_latest.total_cases - data_cul_latest.total_deaths - data_cul_latest.total_recover)
-data_cul_latest = data_cul_latest[['active_cases', 'total_deaths', 'total_recover']]
-
-# Dataset for Bar Chart
-data_global = Data.df[['iso_code', 'continent', 'location', 'date', 'new_cases', 'population']]
-data_global = data_global[data_global.continent == 'Asia']
-data_global = data_global.groupby(['iso_code', 'location', 'population'], as_index=False).sum('new_cases')
-data_global.columns = ['iso_code', 'location', 'population', 'total_cases']
-data_global['index'] = ((data_global['total_cases'] / data_global['population']) * 100)
-
-# Create the Dash app
-app = dash.Dash(__name__, external_stylesheets=external_stylesheets)
+# Downloaded and simplified on first use, by the background publish of the choropleth
+@functools.lru_cache(maxsize=None)
+def malaysia_geojson():
+    with open(data_cache.fetch(data_preprocess.url_geojson)) as f:
+        return geojson_tools.prepare(json.load(f))
+
+
+# Data snapshot, rebuilt in the background and swapped in as a whole. With COVID_SHARED_DATA_DIR set
+# it is built once by a loader process (see gunicorn.conf.py) and every worker attaches to it
+if shared_data.shared_data_dir:
+    snapshot = refresher.DataRefresher(shared_data.Reader(shared_data.shared_data_dir),
+                                       interval=shared_data.poll_interval)
+else:
+    snapshot = refresher.DataRefresher(data_preprocess.Data)
+
+# Create the Dash app. Nothing is downloaded or built here, the first snapshot is loaded by the
+# refresher thread and pages show a loading screen until it is in. The loading screen does not hold
+# the dashboard components, hence suppress_callback_exceptions
+app = dash.Dash(__name__, external_stylesheets=external_stylesheets, suppress_callback_exceptions=True)
 server = app.server
 
-# Set up the app layout
-app.layout = html.Div([
-    # Title and timestamp
-    html.Div([
-        html.Div([
-            html.Img(src=app.get_asset_url('digger.png'),
-                 id='digger-image',
-                 style={
-                     "height": "60px",
-                     "width": "auto",
-                     "margin-bottom": "25px",
-                     "margin-left": "50px"
-                 },
-            )
-        ], className="one column"),
+# Dash encodes every callback response and layout with plotly.utils.PlotlyJSONEncoder, looked up on
+# each response. The orjson based encoder of plain_figure writes the same JSON several times faster
+plotly.utils.PlotlyJSONEncoder = plain_figure.JSONEncoder
+
+# Latency and response size of every callback, with cache and load figures, served at /metrics.
+# Callbacks are registered with callback() rather than app.callback() to be measured
+instrumentation = metrics.Metrics()
+instrumentation.init_app(server)
+callback = instrumentation.callback(app)
+
+# Requests and renders of every figure, served at /figures/stats
+render_stats = figure_cache.RenderStats()
+
+# Figures built by the callbacks, valid for the current data
+figures = figure_cache.FigureCache(stats=render_stats)
+
+# Figures served as prebuilt compressed JSON
+prebuilt_figures = static_figures.StaticFigures(stats=render_stats)
+prebuilt_figures.init_app(server, app.config.routes_pathname_prefix)
+
+# Forecasts, fitted in a process pool for every new snapshot. With a shared snapshot the loader
+# fits them once for all workers, which load its fits
+if shared_data.shared_data_dir:
+    forecaster = forecasting.Forecaster(
+        fits=functools.partial(shared_data.read_forecasts, shared_data.shared_data_dir))
+else:
+    forecaster = forecasting.Forecaster()
+
+
+# Rolling means, growth and Rt, folded forward with the days each snapshot adds
+statistics = rolling_stats.RollingStats()
+snapshot.on_swap(statistics.update)
+
+# Countries ranked by every metric of the comparison bar chart, per continent and overall
+ranks = ranking.RankingIndex()
+snapshot.on_swap(ranks.update)
+
+
+@snapshot.on_swap
+def invalidate_figures(Data):
+    # Drop everything built from the previous snapshot and rebuild it ahead of the next request
+    figures.set_version(Data.version)
+    prebuilt_figures.set_version(Data.version)
+    figures.warm_in_background()
+    prebuilt_figures.publish_in_background()
+    forecaster.update_in_background(Data)
+
+
+@server.route('/healthz')
+def healthz():
+    # Answers as soon as the worker is up, 'ready' tells whether the data is in yet
+    Data = snapshot.current()
+    return flask.jsonify(status='ok', ready=Data is not None, version=Data.version if Data is not None else None)
+
+
+@instrumentation.add_collector
+def figure_metrics():
+    report = render_stats.report()
+    Data = snapshot.current()
+    phases = Data.load_phases.itertuples(index=False) if Data is not None and hasattr(Data, 'load_phases') else []
+    return [
+        ('figure_cache_hits_total', 'counter', 'Callback figures served from the cache', [({}, figures.hits)]),
+        ('figure_cache_misses_total', 'counter', 'Callback figures that had to be built', [({}, figures.misses)]),
+        ('figure_requests_total', 'counter', 'Requests for a figure, from callbacks or downloads',
+         [({'figure': name}, counts['requests']) for name, counts in report['figures'].items()]),
+        ('figure_renders_total', 'counter', 'Builds of a figure on request',
+         [({'figure': name}, counts['renders']) for name, counts in report['figures'].items()]),
+        ('figure_warm_renders_total', 'counter', 'Builds of a figure ahead of requests, warming the cache',
+         [({'figure': name}, counts['warm_renders']) for name, counts in report['figures'].items()]),
+        ('page_views_total', 'counter', 'Dashboard layouts served', [({}, report['page_views'])]),
+        ('data_load_phase_seconds', 'gauge', 'Time spent in each phase of building the current snapshot',
+         [({'phase': phase}, seconds) for phase, seconds in phases]),
+    ]
+
+
+@server.route('/figures/stats')
+def figure_stats():
+    # Requests and renders per figure in this worker, and renders per page view
+    return flask.jsonify(render_stats.report())
+
+
+# Input domains of the callbacks, used to warm the figure cache
+rankings = [10, 20, 30, 40, 50]
+population_types = ['Population Number', 'Population Density']
+line_items = ['new_cases,New Cases,Number of New Cases',
+              'new_deaths,New Deaths,Number of New Deaths',
+              'stringency_index,Stringency Index,Malaysia Stringency Index']
+line_columns = [item.split(',')[0] for item in line_items]
+default_scope = 'Asia'
+default_vaccine_date = date(2021, 6, 25)
+default_forecast_days = 14
+
+
+# Shown until the first snapshot is in, polls and reloads the page once it is
+def loading_layout():
+    return html.Div([
+        dcc.Location(id='loading-location', refresh=True),
+        dcc.Interval(id='loading-poll', interval=2000),
+        html.H4('Loading the latest COVID-19 data...', style={'color': 'white', 'textAlign': 'center',
+                                                             'paddingTop': '200px'}),
+    ], style={'backgroundColor': theme.background, 'minHeight': '100vh'})
+
+
+@callback(Output('loading-location', 'href'), Input('loading-poll', 'n_intervals'), prevent_initial_call=True)
+def reload_when_ready(n_intervals):
+    if snapshot.current() is None:
+        raise PreventUpdate
+    return app.get_relative_path('/')
+
+
+# Set up the app layout, evaluated on every page load so it shows the current snapshot
+def serve_layout():
+    Data = snapshot.current()
+    if Data is None:
+        return loading_layout()
+    # Dash evaluates the layout again to validate it, in the first request of the worker. The figures
+    # in it are requested once per page view, served on the layout route (see count_page_views)
+    requested = (flask.has_request_context() and flask.request.endpoint == layout_endpoint
+                 and not flask.g.get('page_view'))
+    if requested:
+        flask.g.page_view = True
+    states = Data.df_monthly_bystate.columns[1:]
+    forecast_start = Data.data_forecast.date.max().date()
+
+    return html.Div([
+        # Title and timestamp
         html.Div([
             html.Div([
-                html.H3("Data Digger's Covid-19 Dashboard", style={"margin-bottom": "0px", 'color': 'white'}),
-                html.H6("Track Malaysia's Covid - 19 Cases", style={"margin-top": "2px", 'color': 'white'}),
-            ])
-        ], className="one-half column", id="title"),
+                html.Img(src=app.get_asset_url('digger.png'),
+                     id='digger-image',
+                     style={
+                         "height": "60px",
+                         "width": "auto",
+                         "margin-bottom": "25px",
+                         "margin-left": "50px"
+                     },
+                )
+            ], className="one column"),
+            html.Div([
+                html.Div([
+                    html.H3("Data Digger's Covid-19 Dashboard", style={"margin-bottom": "0px", 'color': 'white'}),
+                    html.H6("Track Malaysia's Covid - 19 Cases", style={"margin-top": "2px", 'color': 'white'}),
+                ])
+            ], className="one-half column", id="title"),
 
-        html.Div([
-            html.H6('Last Updated: ' + str(Data.data.date.iloc[-1].strftime("%B %d, %Y")) + '  00:01 (UTC)',
-                    style={'color': 'orange'}),
+            html.Div([
+                html.H6('Last Updated: ' + str(Data.data.date.iloc[-1].strftime("%B %d, %Y")) + '  00:01 (UTC)',
+                        style={'color': 'orange'}),
 
-        ], className="one-third column", id='title1'),
+            ], className="one-third column", id='title1'),
 
-    ], id="header", className="row flex-display", style={"margin-bottom": "25px"}),
+        ], id="header", className="row flex-display", style={"margin-bottom": "25px"}),
 
-    # Numbers of cases, deaths and recovered in Malaysia
-    html.Div([
+        # Numbers of cases, deaths and recovered in Malaysia
         html.Div([
-            html.H6(children='Total Cases',
-                    style={
-                        'textAlign': 'center',
-                        'color': 'white'}
-                    ),
-
-            html.P(f"{Data.data['total_cases'].iloc[-1]:,.0f}",
-                   style={
-                       'textAlign': 'center',
-                       'color': '#DBE6FD',
-                       'fontSize': 40}
-                   ),
-
-            html.P('new:  ' + f"{Data.data['new_cases'].iloc[-1]:,.0f}",
-                   style={
-                       'textAlign': 'center',
-                       'color': '#DBE6FD',
-                       'fontSize': 15,
-                       'margin-top': '-18px'}
-                   )], className="create_container four columns",
-        ),
+            html.Div([
+                html.H6(children='Total Cases',
+                        style={
+                            'textAlign': 'center',
+                            'color': 'white'}
+                        ),
+
+                html.P(f"{Data.data['total_cases'].iloc[-1]:,.0f}",
+                       style={
+                           'textAlign': 'center',
+                           'color': '#DBE6FD',
+                           'fontSize': 40}
+                       ),
+
+                html.P('new:  ' + f"{Data.data['new_cases'].iloc[-1]:,.0f}",
+                       style={
+                           'textAlign': 'center',
+                           'color': '#DBE6FD',
+                           'fontSize': 15,
+                           'margin-top': '-18px'}
+                       )], className="create_container four columns",
+            ),
 
-        html.Div([
-            html.H6(children='Total Deaths',
-                    style={
-                        'textAlign': 'center',
-                        'color': 'white'}
-                    ),
+            html.Div([
+                html.H6(children='Total Deaths',
+                        style={
+                            'textAlign': 'center',
+                            'color': 'white'}
+                        ),
+
+                html.P(f"{Data.data['total_deaths'].iloc[-1]:,.0f}",
+                       style={
+                           'textAlign': 'center',
+                           'color': 'red',
+                           'fontSize': 40}
+                       ),
+
+                html.P('new:  ' + f"{Data.data['new_deaths'].iloc[-1]:,.0f}",
+                       style={
+                           'textAlign': 'center',
+                           'color': 'red',
+                           'fontSize': 15,
+                           'margin-top': '-18px'}
+                       )], className="create_container four columns",
+            ),
 
-            html.P(f"{Data.data['total_deaths'].iloc[-1]:,.0f}",
-                   style={
-                       'textAlign': 'center',
-                       'color': 'red',
-                       'fontSize': 40}
-                   ),
-
-            html.P('new:  ' + f"{Data.data['new_deaths'].iloc[-1]:,.0f}",
-                   style={
-                       'textAlign': 'center',
-                       'color': 'red',
-                       'fontSize': 15,
-                       'margin-top': '-18px'}
-                   )], className="create_container four columns",
-        ),
+            html.Div([
+                html.H6(children='Total Recovery',
+                        style={
+                            'textAlign': 'center',
+                            'color': 'white'}
+                        ),
+
+                html.P(f"{Data.data_cul['total_recover'].iloc[-1]:,.0f}",
+                       style={
+                           'textAlign': 'center',
+                           'color': '#E5D549',
+                           'fontSize': 40}
+                       ),
+
+                html.P('new:  ' + f"{Data.data_cul['recover'].iloc[-1]:,.0f}",
+                       style={
+                           'textAlign': 'center',
+                           'color': '#E5D549',
+                           'fontSize': 15,
+                           'margin-top': '-18px'}
+                       )], className="create_container four columns",
+            )
+        ], className='row flex-display'),
 
+        # Asian comparison and latest pie chart, vaccination pie chart
         html.Div([
-            html.H6(children='Total Recovery',
-                    style={
-                        'textAlign': 'center',
-                        'color': 'white'}
+            # Asian comparison
+            html.Div([
+                html.Div([
+                    dcc.Dropdown(
+                        id='column',
+                        options=options,
+                        value='total_cases',
+                        clearable=False
                     ),
+                    dcc.Dropdown(
+                        id='ranking',
+                        options=ranking_options(default_scope),
+                        value=10,
+                        clearable=False,
+                        style={
+                            'margin-top': '4px'
+                        }
+                    ),
+                    dcc.Dropdown(
+                        id='scope',
+                        options=[{'label': scope, 'value': scope} for scope in ranks.scopes()],
+                        value=default_scope,
+                        clearable=False,
+                        style={
+                            'margin-top': '4px'
+                        }
+                    ),
+                ]),
 
-            html.P(f"{data_cul['total_recover'].iloc[-1]:,.0f}",
-                   style={
-                       'textAlign': 'center',
-                       'color': '#E5D549',
-                       'fontSize': 40}
-                   ),
-
-            html.P('new:  ' + f"{data_cul['recover'].iloc[-1]:,.0f}",
-                   style={
-                       'textAlign': 'center',
-                       'color': '#E5D549',
-                       'fontSize': 15,
-                       'margin-top': '-18px'}
-                   )], className="create_container four columns",
-        )
-    ], className='row flex-display'),
-
-    # Asian comparison and latest pie chart, vaccination pie chart
-    html.Div([
-        # Asian comparison
-        html.Div([
-            html.Div([
-                dcc.Dropdown(
-                    id='column',
-                    options=[
-                        {'label': 'Total Cumulative Cases', 'value': 'total_cases'},
-                        {'label': 'Population', 'value': 'population'},
-                        {'label': 'Infection Rate', 'value': 'index'}
-                    ],
-                    value='total_cases'
-                ),
-                dcc.Dropdown(
-                    id='ranking',
-                    options=[
-                        {'label': '1 - 10', 'value': 10},
-                        {'label': '11 - 20', 'value': 20},
-                        {'label': '21 - 30', 'value': 30},
-                        {'label': '31 - 40', 'value': 40},
-                        {'label': '41 - 50', 'value': 50},
-                    ],
-                    value=10,
+                html.Div([
+                    dcc.Graph(
+                        id='bar',
+                    )
+                ],
                     style={
-                        'margin-top': '4px'
+                        'width': '80%',
+                        'margin-left': '-3px'
                     }
-                ),
-            ]),
+                )
+            ], className='create_container six columns'),
 
+            # Latest pie chart
             html.Div([
                 dcc.Graph(
-                    id='bar',
+                    id='pie-case',
+                    figure=figures.get('pie-case', (), requested=requested)
                 )
-            ],
-                style={
-                    'width': '80%',
-                    'margin-left': '-3px'
-                }
-            )
-        ], className='create_container six columns'),
+            ], className='create_container three columns'),
 
-        # Latest pie chart
-        html.Div([
-            dcc.Graph(
-                id='pie-case'
-            )
-        ], className='create_container three columns'),
-
-        # Vaccination pie chart
-        html.Div([
+            # Vaccination pie chart
             html.Div([
-                dcc.DatePickerSingle(
-                    id='vaccine_date',
-                    min_date_allowed=date(2021, 3, 1),
-                    max_date_allowed=data_vaccination.date.max(),
-                    initial_visible_month=date(2021, 6, 25),
-                    date=date(2021, 6, 25)
-                )
-            ]
+                html.Div([
+                    dcc.DatePickerSingle(
+                        id='vaccine_date',
+                        min_date_allowed=date(2021, 3, 1),
+                        max_date_allowed=Data.data_vaccination.date.max() if len(Data.data_vaccination) else None,
+                        initial_visible_month=default_vaccine_date,
+                        date=default_vaccine_date
+                    )
+                ]
 
-            ),
-            dcc.Graph(
-                id='fig_vaccine'
-            )
-        ], className='create_container three columns'),
+                ),
+                dcc.Graph(
+                    id='fig_vaccine'
+                )
+            ], className='create_container three columns'),
 
-    ], className='row flex-display'),
+        ], className='row flex-display'),
 
-    # Choropleth Chart
-    html.Div([
+        # Choropleth Chart
         html.Div([
-            html.H4(
-                'Changes of Cumulative Confirmed cases of Each States in Malaysia',
-                style={
-                    'text-align': 'center',
-                    'color': 'white',
-                    'font-size': '20px'
-                }),
-            dcc.Graph(id="choropleth")
-        ], className='create_container twelve columns')
-    ], className='row flex-display'),
-
-    # Line Chart and Bar Chart
-    html.Div([
-        # Line Chart
+            html.Div([
+                html.H4(
+                    'Changes of Cumulative Confirmed cases of Each States in Malaysia',
+                    style={
+                        'text-align': 'center',
+                        'color': 'white',
+                        'font-size': '20px'
+                    }),
+                dcc.Graph(id="choropleth",
+                          figure={'layout': {'height': 450, 'plot_bgcolor': theme.background,
+                                             'paper_bgcolor': theme.background,
+                                             'xaxis': {'visible': False}, 'yaxis': {'visible': False}}},
+                          config={'responsive': False})
+            ], className='create_container twelve columns',
+                # Where assets/choropleth.js fetches the figure, under the prefix the app is served at
+                **{'data-figure-url': app.get_relative_path(prebuilt_figures.url('choropleth'))})
+        ], className='row flex-display'),
+
+        # Line Chart and Bar Chart
         html.Div([
+            # Line Chart
             html.Div([
-                dcc.Checklist(
-                    id="check_item",
-                    options=[{'label': 'Daily Cases', 'value': 'new_cases,New Cases,Number of New Cases'},
-                             {'label': 'Daily Deaths', 'value': 'new_deaths,New Deaths,Number of New Deaths'},
-                             {'label': 'Stringency Index',
-                              'value': 'stringency_index,Stringency Index,Malaysia Stringency Index'}],
-                    value=['new_cases,New Cases,Number of New Cases',
-                           'new_deaths,New Deaths,Number of New Deaths']
+                html.Div([
+                    dcc.Checklist(
+                        id="check_item",
+                        options=[{'label': 'Daily Cases', 'value': 'new_cases,New Cases,Number of New Cases'},
+                                 {'label': 'Daily Deaths', 'value': 'new_deaths,New Deaths,Number of New Deaths'},
+                                 {'label': 'Stringency Index',
+                                  'value': 'stringency_index,Stringency Index,Malaysia Stringency Index'}],
+                        value=['new_cases,New Cases,Number of New Cases',
+                               'new_deaths,New Deaths,Number of New Deaths']
 
-                ),
-            ], className='checkbox_container'),
-            dcc.Graph(id="line_graph")
-        ], className='create_container six columns'),
-        # Bar Chart
-        html.Div([
-            dcc.Dropdown(
-                id="select_population_type",
-                options=[{'label': 'Population Number', 'value': 'Population Number'},
-                         {'label': 'Population Density', 'value': 'Population Density'}],
+                    ),
+                    dcc.Checklist(
+                        id="check_stats",
+                        options=[{'label': '7-Day Average', 'value': 'mean_7'},
+                                 {'label': '14-Day Average', 'value': 'mean_14'},
+                                 {'label': 'Weekly Growth (%)', 'value': 'growth_7'},
+                                 {'label': 'Rt', 'value': 'rt'}],
+                        value=[]
+                    ),
+                ], className='checkbox_container'),
+                dcc.Graph(id="line_graph"),
+                dcc.Store(id="line_graph_view"),
+                dcc.Store(id="line_graph_request"),
+                dcc.Store(id="line_graph_series")
+            ], className='create_container six columns'),
+            # Bar Chart
+            html.Div([
+                dcc.Dropdown(
+                    id="select_population_type",
+                    options=[{'label': 'Population Number', 'value': 'Population Number'},
+                             {'label': 'Population Density', 'value': 'Population Density'}],
 
-                value='Population Number'
-            ),
-            dcc.Graph(id="bar_graph")
+                    value='Population Number'
+                ),
+                dcc.Graph(id="bar_graph", figure=figures.get('bar_graph', (), requested=requested))
 
-        ], className='create_container six columns'),
-    ], className='row flex-display'),
+            ], className='create_container six columns'),
+        ], className='row flex-display'),
 
-    # Heatmap and Prediction
-    html.Div([
-        # Heat Map
+        # Heatmap and Prediction
         html.Div([
-            dcc.Dropdown(
-                id="check_states",
-                options=[{'label': x, 'value': x}
-                         for x in states],
-                value=states,
-                multi=True,
-                clearable=False
-            ),
-            dcc.Graph(id="heatmap_monthly_bystate")
-        ], className='create_container seven columns'),
+            # Heat Map
+            html.Div([
+                dcc.Dropdown(
+                    id="check_states",
+                    options=[{'label': x, 'value': x}
+                             for x in states],
+                    value=states,
+                    multi=True,
+                    clearable=False
+                ),
+                dcc.Graph(id="heatmap_monthly_bystate")
+            ], className='create_container seven columns'),
+
+            # Prediction
+            html.Div([
+                html.Div([
+                    html.H4(
+                        "Prediction on Malaysia Daily Deaths from Daily Cases",
+                        style={
+                            'text-align': 'center',
+                            'color': 'white',
+                            'font-size': '20px',
+                            'margin-bottom': '20px'
+                        }
+                    ),
+                ]),
+                dcc.Graph(
+                    id='seaborn-graph',
+                    figure=figures.get('regplot', (), requested=requested),
+                    style={
+                        'display': 'flex'
+                    }
+                )
+            ], className='create_container five columns'),
 
-        # Prediction
+        ], className='row flex-display'),
+
+        # Forecast
         html.Div([
             html.Div([
                 html.H4(
-                    "Prediction on Malaysia Daily Deaths from Daily Cases",
+                    "Forecast of Daily Cases and Deaths",
                     style={
                         'text-align': 'center',
                         'color': 'white',
@@ -365,275 +465,274 @@ app.layout = html.Div([
                         'margin-bottom': '20px'
                     }
                 ),
-            ]),
-            dcc.Graph(
-                id='seaborn-graph',
-                figure=regplot_fig_url,
-                style={
-                    'display': 'flex'
-                }
-            )
-        ], className='create_container five columns'),
+                html.Div([
+                    dcc.Dropdown(
+                        id='forecast_series',
+                        options=[{'label': 'Malaysia Daily Cases', 'value': 'Malaysia|new_cases'},
+                                 {'label': 'Malaysia Daily Deaths', 'value': 'Malaysia|new_deaths'}] +
+                                [{'label': f'{state} Daily Cases', 'value': f'{state}|new_cases'}
+                                 for state in Data.df_daily_bystate.columns[1:]],
+                        value='Malaysia|new_cases',
+                        clearable=False,
+                        style={'width': '300px'}
+                    ),
+                    dcc.Dropdown(
+                        id='forecast_model',
+                        options=[{'label': model.label, 'value': name}
+                                 for name, model in forecasting.models.items()],
+                        value=next(iter(forecasting.models)),
+                        clearable=False,
+                        style={'width': '250px'}
+                    ),
+                    dcc.DatePickerSingle(
+                        id='forecast_date',
+                        min_date_allowed=forecast_start + timedelta(days=1),
+                        max_date_allowed=forecast_start + timedelta(days=forecaster.horizon),
+                        initial_visible_month=forecast_start,
+                        date=forecast_start + timedelta(days=default_forecast_days)
+                    ),
+                ], style={'display': 'flex', 'gap': '10px'}),
+                dcc.Graph(id='forecast_graph')
+            ], className='create_container twelve columns'),
+        ], className='row flex-display'),
+
+    ])
 
-    ], className='row flex-display'),
-])
 
 # Option Columns
 options = [
     {'label': 'Total Cumulative Cases', 'value': 'total_cases'},
+    {'label': 'Total Deaths', 'value': 'total_deaths'},
+    {'label': 'People Vaccinated', 'value': 'people_vaccinated'},
+    {'label': 'People Fully Vaccinated', 'value': 'people_fully_vaccinated'},
     {'label': 'Population', 'value': 'population'},
-    {'label': 'Infection Rate', 'value': 'index'}
+    {'label': 'Infection Rate', 'value': 'index'},
+    {'label': 'Deaths per Million', 'value': 'deaths_per_million'},
+    {'label': 'Vaccination Rate', 'value': 'vaccinated_rate'},
+    {'label': 'Full Vaccination Rate', 'value': 'fully_vaccinated_rate'}
 ]
 
 
 # Set the callback function
 
-# Asian comparison
-@app.callback(
+def ranking_options(scope):
+    # Pages of ten down to the last country of the scope
+    return [{'label': f'{page - 9} - {page}', 'value': page} for page in range(10, ranks.size(scope) + 10, 10)]
+
+
+@callback(
+    Output(component_id='ranking', component_property='options'),
+    Input(component_id='scope', component_property='value'))
+def update_ranking_options(scope):
+    return ranking_options(scope)
+
+
+# Country comparison
+@callback(
     Output(component_id='bar', component_property='figure'),
     Input(component_id='column', component_property='value'),
-    Input(component_id='ranking', component_property='value'))
-def update_confirmed(column, ranking):
-    data_global.sort_values(column, ascending=False, inplace=True)
-    selected_data = data_global[ranking - 10:ranking]
-    malaysia_data = data_global[data_global.iso_code == 'MYS']
-    got_malaysia = False
-    for i, r in selected_data.iterrows():
-        if r.iso_code == 'MYS':
-            got_malaysia = True
-            break
-    if not got_malaysia:
-        selected_data = selected_data.append(malaysia_data, ignore_index=True)
-    selected_data.sort_values(column, ascending=False, inplace=True)
-    # for i, r in selected_data.iterrows():
-    #     print(r.iso_code)
-    # fig = px.bar(x=selected_data.location,  # countries name in Asia
-    #              y=selected_data[column],  # Total recent confirmed cases
-    #              title='Total Cases (Asia countries)',
-    #              hover_name=selected_data.location,
-    #              color=selected_data[column],
-    #              color_continuous_scale='Agsunset')
+    Input(component_id='ranking', component_property='value'),
+    Input(component_id='scope', component_property='value'))
+@figures.memoize('bar', domain=lambda: itertools.product([o['value'] for o in options], rankings, [default_scope]))
+def update_confirmed(column, ranking, scope):
+    # The first page when no page is picked
+    ranking = ranking or 10
+    selected_data = ranks.page(scope, column, ranking - 10, ranking)
+    hover_rank = ['' if np.isnan(rank) else f'#{rank:.0f}' for rank in selected_data['rank']]
     y_title = [f"{o['label']}" for o in options if column == o["value"]]
-    # print(y_title)
-    # fig.update_layout(xaxis_title='Country',
-    #                   yaxis_title=column,
-    #                   coloraxis_showscale=False)
-    return {
-        'data': [go.Bar(x=selected_data.location,
-                        y=selected_data[column],
-                        name='Daily confirmed',
-                        marker=dict(
-                            color='orange'),
-                        )],
-        'layout': go.Layout(
-            plot_bgcolor='#47597E',
-            paper_bgcolor='#47597E',
-            hovermode='x',
+    return go.Figure(
+        data=[go.Bar(x=selected_data.location,
+                     y=selected_data[column],
+                     customdata=hover_rank,
+                     hovertemplate='%{customdata} %{x}: %{y}<extra></extra>',
+                     name='Daily confirmed',
+                     marker=dict(
+                         color='orange'),
+                     )],
+        layout=go.Layout(
             title={
-                'text': f'Top {ranking - 10}-{ranking} {y_title[0]} in Asia Compared to Malaysia',
-                'y': 0.93,
-                'x': 0.5,
-                'xanchor': 'center',
-                'yanchor': 'top'
-            },
-            titlefont={
-                'color': 'white',
-                'size': 17
+                'text': f'Top {ranking - 9}-{ranking} {y_title[0]} in {scope} Compared to Malaysia',
+                'font': {'size': 17}
             },
             margin=dict(r=30),
             xaxis=dict(
                 title='<b>Country</b>',
-                color='white',
-                showline=True,
                 showgrid=True,
-                showticklabels=True,
-                linecolor='white',
-                linewidth=2,
-                ticks='outside',
-                tickfont=dict(
-                    family='Arial',
-                    size=11,
-                    color='white'
-                )
+                linewidth=2
             ),
             yaxis=dict(
                 title='<b>Daily confirmed Cases</b>',
-                color='white',
-                showline=True,
                 showgrid=True,
-                showticklabels=True,
-                linecolor='white',
-                linewidth=2,
-                ticks='outside',
-                tickfont=dict(
-                    family='Arial',
-                    size=11,
-                    color='white'
-                )
+                linewidth=2
             ),
-
             legend={
                 'orientation': 'h',
-                'bgcolor': '#47597E',
                 'xanchor': 'center', 'x': 0.5, 'y': -0.03
-            },
-            font=dict(
-                family='sans-serif',
-                size=11,
-                color='white'
-            )
+            }
         )
-    }
+    )
 
 
-# Cases Pie Chart
-@app.callback(
-    Output(component_id='pie-case', component_property='figure'),
-    [Input("select_population_type", "value")]
-)
-def update_confirmed(none):
+# Cases Pie Chart, it has no inputs and is sent with the page
+@figures.memoize('pie-case', domain=lambda: [()])
+def pie_case_figure():
+    Data = snapshot.current()
     colors = ['#1768AC', '#E5D549', '#2541B2']
-    return {
-        'data': [go.Pie(labels=['Active Cases', 'Total Deaths', 'Total Recovered'],
-                        values=data_cul_latest.values[0],
-                        marker=dict(colors=colors),
-                        textinfo='label+value',
-                        textfont=dict(size=11),
-                        hole=0.6,
-                        rotation=35
-                        )],
-        'layout': go.Layout(
-            plot_bgcolor='#47597E',
-            paper_bgcolor='#47597E',
+    return go.Figure(
+        data=[go.Pie(labels=['Active Cases', 'Total Deaths', 'Total Recovered'],
+                     values=Data.data_cul_latest.values[0],
+                     marker=dict(colors=colors),
+                     textinfo='label+value',
+                     textfont=dict(size=11),
+                     hole=0.6,
+                     rotation=35
+                     )],
+        layout=go.Layout(
             hovermode='closest',
             title={
-                'text': 'Latest Cases in Malaysia',
-                'y': 0.93,
-                'x': 0.5,
-                'xanchor': 'center',
-                'yanchor': 'top'
-            },
-            titlefont={
-                'color': 'white',
-                'size': 20
+                'text': 'Latest Cases in Malaysia'
             },
             legend={
                 'orientation': 'h',
-                'bgcolor': '#47597E',
                 'xanchor': 'center', 'x': 0.5, 'y': -0.07
-            },
-            font=dict(
-                family='sans-serif',
-                size=11,
-                color='white'
-            )
+            }
         )
-    }
+    )
 
 
 # Vaccination Pie Chart
-@app.callback(
+@callback(
     Output(component_id='fig_vaccine', component_property='figure'),
     Input(component_id='vaccine_date', component_property='date')
 )
+@figures.memoize('fig_vaccine', domain=lambda: [[default_vaccine_date.isoformat()]])
 def update_confirmed(vaccine_date):
-    data_vaccination_recent = data_vaccination[data_vaccination.date == vaccine_date]
-    data_vaccination_recent[
-        'unvaccinated'] = -data_vaccination_recent.people_vaccinated + data_vaccination_recent.population
-    data_vaccination_recent[
-        '1st_dose_vaccinated'] = data_vaccination_recent.people_vaccinated - data_vaccination_recent.people_fully_vaccinated
-    data_vaccination_recent = data_vaccination_recent[
-        ['people_fully_vaccinated', 'unvaccinated', '1st_dose_vaccinated']]
+    vaccination = snapshot.current().data_vaccination
+    # One row per day, dates before the first report or after the last take the nearest one. An empty
+    # pie until there are reports
+    values = []
+    if len(vaccination):
+        day = (date.fromisoformat(vaccine_date[:10]) - vaccination.date.iloc[0].date()).days
+        values = vaccination.iloc[min(max(day, 0), len(vaccination) - 1), 1:].to_numpy()
     colors = ['#DBE6FD', '#293B5F', '#B2AB8C']
-    return {
-        'data': [go.Pie(labels=['Fully Vaccinated', 'Unvaccinated', '1st Dose Vaccinated'],
-                        values=data_vaccination_recent.values[0],
-                        marker=dict(colors=colors),
-                        textinfo='label+value',
-                        textfont=dict(size=11),
-                        # names=['2nd Dosed Population', 'Unvaccinated Population', '1st Dosed Only Population'],
-                        hole=0.6,
-                        rotation=35
-                        )],
-        'layout': go.Layout(
-            plot_bgcolor='#47597E',
-            paper_bgcolor='#47597E',
+    return go.Figure(
+        data=[go.Pie(labels=['Fully Vaccinated', 'Unvaccinated', '1st Dose Vaccinated'],
+                     values=values,
+                     marker=dict(colors=colors),
+                     textinfo='label+value',
+                     textfont=dict(size=11),
+                     # names=['2nd Dosed Population', 'Unvaccinated Population', '1st Dosed Only Population'],
+                     hole=0.6,
+                     rotation=35
+                     )],
+        layout=go.Layout(
             hovermode='closest',
             title={
-                'text': 'Vaccination Rate in Malaysia',
-                'y': 0.93,
-                'x': 0.5,
-                'xanchor': 'center',
-                'yanchor': 'top'
-            },
-            titlefont={
-                'color': 'white',
-                'size': 20
+                'text': 'Vaccination Rate in Malaysia'
             },
             legend={
                 'orientation': 'h',
-                'bgcolor': '#47597E',
                 'xanchor': 'center', 'x': 0.5, 'y': -0.07
-            },
-            font=dict(
-                family='sans-serif',
-                size=11,
-                color='white'
-            )
+            }
         )
-    }
+    )
 
 
-# Choropleth chart
-@app.callback(
-    Output("choropleth", "figure"),
-    [Input("select_population_type", "value")]
-)
-def update_confirmed(none):
-    fig = px.choropleth(Data.df_cumulative_restruct,
-                        geojson=mysgeojson,
-                        height=450,
-                        width=1200,
-                        locations="state", featureidkey="properties.name", color="cumulative case",
-                        color_continuous_scale="plotly3",
-                        labels={'cumulative case': 'Cumulative Case'},
-                        animation_frame="year_month",
-                        hover_name="state")
-    fig.update_geos(fitbounds="geojson", visible=False)
-    fig.update_layout(
-        # margin={"r": 10, "t": 0, "l": 10, "b": 0},
-        plot_bgcolor='#47597E',
-        paper_bgcolor='#47597E',
-        font=dict(
-            family='sans-serif',
-            size=13,
-            color='white'
-        )
+# Choropleth chart, too heavy for a callback. It is built once per data version and the browser
+# fetches it from /figures/choropleth.json when the chart scrolls into view (assets/choropleth.js)
+@prebuilt_figures.register('choropleth')
+def choropleth_figure():
+    Data = snapshot.current()
+
+    # Cumulative case of each region at the end of every month, one animation frame per month and
+    # the display name of the region as hover text
+    df_month_end = Data.df_cumulative_restruct.groupby(['year_month', 'state'], as_index=False)['cumulative case'].last()
+    months = df_month_end['year_month'].dt.strftime('%Y/%m')
+    mapped = Data.regions.dropna(subset=['geojson_key'])
+    df_month_end['name'] = df_month_end['state'].map(mapped.set_index('geojson_key')['name'])
+
+    # Plain dicts, a go.Figure would validate every frame. Each frame holds the month's values
+    frames = [{'name': month,
+               'data': [{'type': 'choropleth',
+                         'locations': df_month['state'],
+                         'z': df_month['cumulative case'],
+                         'hovertext': df_month['name']}]}
+              for month, df_month in df_month_end.groupby(months)]
+    latest = frames[-1]['data'][0]
+
+    animation_args = {'frame': {'duration': 500, 'redraw': True}, 'mode': 'immediate', 'fromcurrent': True,
+                      'transition': {'duration': 0}}
+    return plain_figure.figure(
+        data=[dict(latest,
+                   geojson=malaysia_geojson(),
+                   featureidkey='properties.name',
+                   hovertemplate='<b>%{hovertext}</b><br>Cumulative Case=%{z}<extra></extra>',
+                   coloraxis='coloraxis')],
+        layout=dict(
+            geo=dict(fitbounds='geojson', visible=False),
+            height=450,
+            width=1200,
+            coloraxis=dict(
+                colorscale=plotly.colors.get_colorscale('plotly3'),
+                cmin=0,
+                cmax=df_month_end['cumulative case'].max(),
+                colorbar=dict(title=dict(text='Cumulative Case'))
+            ),
+            updatemenus=[dict(
+                type='buttons',
+                direction='left',
+                showactive=False,
+                x=0.1, xanchor='right', y=0, yanchor='top',
+                pad={'r': 10, 't': 70},
+                buttons=[dict(label='&#9654;', method='animate', args=[None, animation_args]),
+                         dict(label='&#9724;', method='animate',
+                              args=[[None], dict(animation_args, frame={'duration': 0, 'redraw': True})])]
+            )],
+            sliders=[dict(
+                active=len(frames) - 1,
+                currentvalue={'prefix': 'Month: '},
+                len=0.9,
+                x=0.1, xanchor='left', y=0, yanchor='top',
+                pad={'b': 10, 't': 60},
+                steps=[dict(label=frame['name'], method='animate',
+                            args=[[frame['name']], dict(animation_args, frame={'duration': 0, 'redraw': True})])
+                       for frame in frames]
+            )],
+            font=dict(
+                size=13
+            )
+        ),
+        frames=frames
     )
 
-    return fig
-
 
-# Bar Chart
-@app.callback(
+# Bar Chart, sent with the page with a trace for each population measure. The dropdown shows one of
+# them in the browser (assets/bar_graph.js)
+app.clientside_callback(
+    ClientsideFunction(namespace='bar_graph', function_name='population'),
     Output("bar_graph", "figure"),
-    [Input("select_population_type", "value")]
+    [Input("select_population_type", "value")],
+    [State("bar_graph", "figure")]
 )
-def update_bar(population_type):
+
+
+@figures.memoize('bar_graph', domain=lambda: [()])
+def bar_graph_figure():
+    Data = snapshot.current()
     states = Data.df_case_with_pop['State']
-    states_population = Data.df_case_with_pop['Population']
-    if population_type == "Population Number":
-        states_population = Data.df_case_with_pop['Population']
-    elif population_type == "Population Density":
-        states_population = Data.df_case_with_pop['Population Density']
+    states_population = {'Population Number': Data.df_case_with_pop['Population'],
+                         'Population Density': Data.df_case_with_pop['Population Density']}
     states_cum_case = Data.df_case_with_pop['Cumulative Case']
 
     fig = go.Figure()
-    fig.add_trace(go.Bar(x=states,
-                         y=states_population,
-                         name=population_type,
-                         marker_color='#DBE6FD',
-                         yaxis='y', offsetgroup=1))
+    for population_type in population_types:
+        fig.add_trace(go.Bar(x=states,
+                             y=states_population[population_type],
+                             name=population_type,
+                             meta={'population': population_type},
+                             visible=population_type == population_types[0],
+                             marker_color='#DBE6FD',
+                             yaxis='y', offsetgroup=1))
     fig.add_trace(go.Bar(x=states,
                          y=states_cum_case,
                          name='Cumulative Case',
@@ -641,64 +740,20 @@ def update_bar(population_type):
                          yaxis='y2', offsetgroup=2))
 
     fig.update_layout(
-        plot_bgcolor='#47597E',
-        paper_bgcolor='#47597E',
-        hovermode='x',
         title={
-            'text': 'Malaysia Cumulative Cases against Population by States',
-            'y': 0.93,
-            'x': 0.5,
-            'xanchor': 'center',
-            'yanchor': 'top'
-        },
-        titlefont={
-            'color': 'white',
-            'size': 20
+            'text': 'Malaysia Cumulative Cases against Population by States'
         },
         xaxis=dict(
             title='<b>States</b>',
-            color='white',
-            showline=True,
-            showgrid=False,
-            showticklabels=True,
-            linecolor='white',
-            linewidth=1,
-            ticks='outside',
-            tickfont=dict(
-                family='Arial',
-                size=11,
-                color='white'
-            )
+            showgrid=False
         ),
         yaxis=dict(
-            title=f'<b>{population_type}</b>',
-            color='white',
-            showline=True,
-            showgrid=False,
-            showticklabels=True,
-            linecolor='white',
-            linewidth=1,
-            ticks='outside',
-            tickfont=dict(
-                family='Arial',
-                size=11,
-                color='white'
-            )
+            title=f'<b>{population_types[0]}</b>',
+            showgrid=False
         ),
         yaxis2=dict(
             title='<b>Covid-19 Cumulative Cases </b>',
-            color='white',
-            showline=True,
             showgrid=False,
-            showticklabels=True,
-            linecolor='white',
-            linewidth=1,
-            ticks='outside',
-            tickfont=dict(
-                family='Arial',
-                size=11,
-                color='white'
-            ),
             overlaying='y',
             side='right'
         ),
@@ -706,14 +761,8 @@ def update_bar(population_type):
         legend={
             'x': 0.1,
             'y': 1.15,
-            'bgcolor': '#47597E',
             'xanchor': 'center'
         },
-        font=dict(
-            family='sans-serif',
-            size=11,
-            color='white'
-        ),
         xaxis_tickangle=-45,
         barmode='group',
         bargap=0.15,  # gap between bars of adjacent location coordinates.
@@ -723,126 +772,170 @@ def update_bar(population_type):
     return fig
 
 
-# Line Chart
-@app.callback(
+# Line Chart. The visible date range and width of the chart are picked up in the browser
+# (assets/line_graph.js), every series is cut to that range and downsampled to about one point per
+# pixel. Only the checked series and statistics are sent, the browser asks for more when one that
+# was not sent is checked, and hides the ones unchecked without a request
+app.clientside_callback(
+    ClientsideFunction(namespace='line_graph', function_name='view'),
+    Output("line_graph_view", "data"),
+    [Input("line_graph", "relayoutData")]
+)
+
+app.clientside_callback(
+    ClientsideFunction(namespace='line_graph', function_name='request'),
+    Output("line_graph_request", "data"),
+    [Input("line_graph_view", "data"),
+     Input("check_item", "value"),
+     Input("check_stats", "value")],
+    [State("line_graph_request", "data")]
+)
+
+app.clientside_callback(
+    ClientsideFunction(namespace='line_graph', function_name='figure'),
     Output("line_graph", "figure"),
-    [Input("check_item", "value")]
+    [Input("check_item", "value"),
+     Input("check_stats", "value"),
+     Input("line_graph_series", "data")]
 )
-def update_line_case_deaths_stringency(checked_item):
-    fig = make_subplots(specs=[[{"secondary_y": True}]])
-
-    temp1 = []
-    temp2 = []
-    if len(checked_item) == 0:
-        # Add traces
-        fig.add_trace(
-            go.Scatter(x=Data.data.date, y=Data.data['new_cases'], name="New Cases"),
-            secondary_y=False,
-        )
-    else:
-        # Add traces
-        temp1 = checked_item[0].split(",")
-        fig.add_trace(
-            go.Scatter(x=Data.data.date, y=Data.data[temp1[0]], name=temp1[1]),
-            secondary_y=False,
-        )
 
-        if len(checked_item) == 2:
-            temp2 = checked_item[1].split(",")
-            fig.add_trace(
-                go.Scatter(x=Data.data.date, y=Data.data[temp2[0]], name=temp2[1]),
-                secondary_y=True,
-            )
 
-    # Add figure title
-    fig.update_layout(
-        # title_text="Malaysia New Case and Death",
-        plot_bgcolor='#47597E',
-        paper_bgcolor='#47597E',
-        hovermode='x',
+@callback(
+    Output("line_graph_series", "data"),
+    [Input("line_graph_request", "data")]
+)
+def update_line_case_deaths_stringency(request):
+    request = request or {}
+    columns = [column for column in request.get('columns') or [] if column in line_columns] or [line_columns[0]]
+    stats = [stat for stat in request.get('stats') or [] if stat in rolling_stats.statistics]
+    return line_graph_series(request.get('range'), downsample.points_for(request.get('width')),
+                             tuple(columns), tuple(stats))
+
+
+@figures.memoize('line_graph', domain=lambda: [[None, downsample.default_width, tuple(line_columns[:2]), ()]])
+def line_graph_series(x_range, width, columns, stats):
+    # The series of columns and their statistics in stats, on the primary axis. meta tells the
+    # browser which column and statistic a trace is, it moves them to their axis
+    Data = snapshot.current()
+    start, end = x_range or (None, None)
+    data = []
+
+    def series(dates, values):
+        return downsample.series(dates, values, start, end, width)
+
+    for item in line_items:
+        column, name = item.split(",")[:2]
+        if column not in columns:
+            continue
+        x, y = series(Data.data.date, Data.data[column])
+        data.append(dict(type='scatter', x=x, y=y, name=name, meta={'column': column}))
+
+    # Rolling statistics of the case and death series
+    for column, name in (('new_cases', 'New Cases'), ('new_deaths', 'New Deaths')):
+        if column not in columns:
+            continue
+        table = statistics.table('Malaysia', column)
+        for stat, label in (('mean_7', '7-Day Average'), ('mean_14', '14-Day Average')):
+            if stat in stats:
+                x, y = series(table.date, table[stat])
+                data.append(dict(type='scatter', x=x, y=y, name=f'{name} ({label})',
+                                 meta={'column': column, 'stat': stat}, line=dict(width=2, dash='dot')))
+        # Growth and Rt have no unit, they get an axis of their own
+        for stat, label in (('growth_7', 'Weekly Growth %'), ('rt', 'Rt')):
+            if stat in stats:
+                x, y = series(table.date, table[stat])
+                data.append(dict(type='scatter', x=x, y=y, name=f'{name} ({label})',
+                                 meta={'column': column, 'stat': stat}, line=dict(width=1)))
+
+    # The axes of a chart with a secondary y axis. The browser leaves room on the right when the
+    # growth and Rt axis is shown
+    xaxis = dict(anchor='y', domain=[0.0, 0.94], title=dict(text='<b>Date</b>'))
+    if x_range:
+        # Keep the zoom the figure was built for
+        xaxis['range'] = list(x_range)
+
+    return plain_figure.figure(data, layout=dict(
         title={
-            'text': "Malaysia Daily Cases vs Daily Deaths vs Stringency Index",
-            'y': 0.93,
-            'x': 0.5,
-            'xanchor': 'center',
-            'yanchor': 'top'
+            'text': "Malaysia Daily Cases vs Daily Deaths vs Stringency Index"
         },
-        titlefont={
-            'color': 'white',
-            'size': 20
-        },
-        xaxis=dict(
-            # title='<b>States</b>',
-            color='white',
-            showline=True,
-            showticklabels=True,
-            linecolor='white',
-            linewidth=1,
-            ticks='outside',
-            tickfont=dict(
-                family='Arial',
-                size=11,
-                color='white'
-            )
-        ),
-        yaxis=dict(
-            # title=f'<b>{population_type}</b>',
-            color='white',
-            showline=True,
-            showticklabels=True,
-            linecolor='white',
-            linewidth=1,
-            ticks='outside',
+        xaxis=xaxis,
+        yaxis=dict(anchor='x', domain=[0.0, 1.0]),
+        yaxis2=dict(anchor='x', overlaying='y', side='right'),
+        yaxis3=dict(
+            overlaying='y',
+            side='right',
+            anchor='free',
+            position=1,
+            showline=False,
+            ticks='',
+            showgrid=False,
+            zeroline=False,
+            visible=False,
+            color='orange',
             tickfont=dict(
-                family='Arial',
-                size=11,
-                color='white'
+                color='orange'
             )
-        ),
-        yaxis2=dict(
-            # title=f'<b>{population_type}</b>',
-            color='white',
-            showline=True,
-            showticklabels=True,
-            linecolor='white',
-            linewidth=1,
-            ticks='outside',
-            tickfont=dict(
-                family='Arial',
-                size=11,
-                color='white'
+        )
+    ))
+
+
+# Regression of daily deaths on daily cases, the band is folded forward as new days come in
+deaths_regression = regression.RegressionBand()
+
+
+@figures.memoize('regplot', domain=lambda: [()])
+def regplot_figure():
+    Data = snapshot.current()
+    df = Data.data_second_year
+    deaths_regression.update(df['date'].map(date.toordinal), df['new_cases'], df['new_deaths'])
+    grid, fitted, low, high = deaths_regression.band()
+
+    # A point per day, as a plain figure
+    return plain_figure.figure(
+        data=[
+            dict(type='scatter', x=df['new_cases'], y=df['new_deaths'], mode='markers', name='Daily',
+                 marker=dict(color='#DBE6FD', opacity=0.3)),
+            dict(type='scatter', x=np.concatenate([grid, grid[::-1]]), y=np.concatenate([high, low[::-1]]),
+                 fill='toself', fillcolor='rgba(255, 124, 67, 0.15)', line=dict(width=0), hoverinfo='skip',
+                 name='95% CI'),
+            dict(type='scatter', x=grid, y=fitted, mode='lines', name='Fit', line=dict(color='#ff7c43', width=2)),
+        ],
+        layout=dict(
+            showlegend=False,
+            margin=dict(l=60, r=20, t=20, b=60),
+            hovermode='closest',
+            width=500,
+            height=400,
+            xaxis=dict(
+                title=dict(text='<b>Daily Cases</b>'),
+                range=[df['new_cases'].min() - 100, 10000],
+                gridcolor='#5b6c91',
+                zeroline=False,
+                showgrid=True,
+                linewidth=2
+            ),
+            yaxis=dict(
+                title=dict(text='<b>Daily Deaths</b>'),
+                range=[0, 150],
+                gridcolor='#5b6c91',
+                zeroline=False,
+                showgrid=True,
+                linewidth=2
             )
-        ),
-        font=dict(
-            family='sans-serif',
-            size=11,
-            color='white'
-        ),
+        )
     )
 
-    # Set x-axis title
-    fig.update_xaxes(title_text="<b>Date</b>")
-
-    # Set y-axes titles
-    # fig.update_yaxes(title_text="<b>Number of New Cases</b>", secondary_y=False)
-    # fig.update_yaxes(title_text="<b>Number of New Deaths</b>", secondary_y=True)
-    if len(temp1):
-        fig.update_yaxes(title_text="<b>" + temp1[2], secondary_y=False)
-        if len(temp2):
-            fig.update_yaxes(title_text="<b>" + temp2[2], secondary_y=True)
-    else:
-        fig.update_yaxes(title_text="<b>Number of New Cases</b>", secondary_y=False)
-
-    return fig
-
 
 # Heatmap Monthly by State
-@app.callback(
+@callback(
     Output("heatmap_monthly_bystate", "figure"),
     [Input("check_states", "value")]
 )
+@figures.memoize('heatmap_monthly_bystate',
+                 domain=lambda: [[list(snapshot.current().df_monthly_bystate.columns[1:])]])
 def update_heatmap_monthly_bystate(checked_states):
-    dates = Data.df_monthly_bystate['year_month']
+    Data = snapshot.current()
+    dates = Data.df_monthly_bystate['year_month'].dt.strftime('%Y/%m')
     display_states = checked_states
     monthly_cases = Data.df_monthly_bystate[checked_states].T
 
@@ -854,60 +947,83 @@ def update_heatmap_monthly_bystate(checked_states):
 
     fig.update_layout(
         xaxis_nticks=36,
-        plot_bgcolor='#47597E',
-        paper_bgcolor='#47597E',
-        hovermode='x',
         title={
-            'text': 'Monthly Increased Cases by State',
-            'y': 0.93,
-            'x': 0.5,
-            'xanchor': 'center',
-            'yanchor': 'top'
-        },
-        titlefont={
-            'color': 'white',
-            'size': 20
+            'text': 'Monthly Increased Cases by State'
         },
         margin=dict(r=50),
         xaxis=dict(
             title='<b>Date</b>',
-            color='white',
             showline=False,
-            showgrid=False,
-            showticklabels=True,
-            linecolor='white',
-            linewidth=2,
-            ticks='outside',
-            tickfont=dict(
-                family='Arial',
-                size=11,
-                color='white'
-            )
+            showgrid=False
         ),
         yaxis=dict(
             title='<b>States</b>',
-            color='white',
             showline=False,
-            showgrid=False,
-            showticklabels=True,
-            linecolor='white',
-            linewidth=2,
-            ticks='outside',
-            tickfont=dict(
-                family='Arial',
-                size=11,
-                color='white'
-            )
-        ),
-        font=dict(
-            family='sans-serif',
-            size=11,
-            color='white'
+            showgrid=False
         )
     )
 
     return fig
 
 
+# Forecast, the fits are precomputed so this only slices them
+@callback(
+    Output('forecast_graph', 'figure'),
+    Input('forecast_series', 'value'),
+    Input('forecast_model', 'value'),
+    Input('forecast_date', 'date'))
+def update_forecast(series, model, forecast_date):
+    Data = snapshot.current()
+    region, metric = series.split('|')
+    history = forecasting.daily_series(Data)[(region, metric)].iloc[-90:]
+    forecast = forecaster.get(model, region, metric, forecast_date)
+
+    data = [go.Scatter(x=history.index, y=history.values, mode='lines', name='Reported',
+                       line=dict(color='#DBE6FD'))]
+    annotations = []
+    if forecast is None:
+        annotations.append(dict(text='The forecast is being computed, check back shortly', showarrow=False,
+                                xref='paper', yref='paper', x=0.5, y=0.9, font=dict(color='orange', size=14)))
+    else:
+        data.append(go.Scatter(x=forecast.index, y=forecast.values, mode='lines', name='Forecast',
+                               line=dict(color='#ff7c43', dash='dash')))
+
+    return go.Figure(
+        data=data,
+        layout=go.Layout(
+            hovermode='x unified',
+            height=400,
+            annotations=annotations,
+            legend={'orientation': 'h', 'xanchor': 'center', 'x': 0.5, 'y': -0.15},
+            xaxis=dict(linewidth=2),
+            yaxis=dict(linewidth=2, gridcolor='#5b6c91')
+        )
+    )
+
+
+app.layout = serve_layout
+layout_endpoint = app.config.routes_pathname_prefix + '_dash-layout'
+
+
+def count_page_views(view):
+    # Only the dashboard served on the layout route is a page view, not the loading page nor the layout
+    # Dash evaluates to validate it
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        response = view(*args, **kwargs)
+        if flask.g.pop('page_view', False):
+            render_stats.page_view()
+        return response
+
+    return wrapper
+
+
+server.view_functions[layout_endpoint] = count_page_views(server.view_functions[layout_endpoint])
+
+# Build the first snapshot in the background, later ones on the refresh interval. Not in the
+# forecasting pool's workers, which import this module again when it is run as a script
+if __name__ != '__mp_main__':
+    snapshot.start()
+
 if __name__ == '__main__':
     app.run_server(debug=True)
@@ -0,0 +1,185 @@
+# Instrumentation of the Dash callbacks, exposed in the Prometheus text format at /metrics.
+#
+# Metrics.callback(app) is used in place of app.callback. It times every call of the callback and,
+# from the response, records how long the whole request took, JSON encoding included, and how many
+# bytes were sent back. All are histograms labelled with the callback's output. Anything else, such as cache counters or the load phases of the current
+# snapshot, is read when /metrics is scraped by the collectors added with add_collector.
+#
+# With COVID_PROFILE_SAMPLE set to a fraction, that share of the callback calls runs under cProfile
+# and the accumulated profile is served at /metrics/profile. Only one call is profiled at a time.
+# Everything is per process, so per gunicorn worker.
+import cProfile
+import functools
+import io
+import os
+import pstats
+import random
+import threading
+import time
+
+import flask
+
+profile_sample = float(os.environ.get('COVID_PROFILE_SAMPLE', 0))
+
+latency_buckets = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+size_buckets = [1024, 4096, 16384, 65536, 262144, 1048576, 4194304]
+
+
+def format_labels(labels, **extra):
+    labels = dict(labels, **extra)
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{k}="{v}"' for k, v in sorted(labels.items())) + '}'
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.count += 1
+        self.sum += value
+
+    def lines(self, name, labels):
+        lines = [f'{name}_bucket{format_labels(labels, le=bound)} {count}'
+                 for bound, count in zip(self.buckets, self.counts)]
+        lines.append(f'{name}_bucket{format_labels(labels, le="+Inf")} {self.count}')
+        lines.append(f'{name}_sum{format_labels(labels)} {self.sum}')
+        lines.append(f'{name}_count{format_labels(labels)} {self.count}')
+        return lines
+
+
+class Metrics:
+    def __init__(self, profile_sample=profile_sample):
+        self.profile_sample = profile_sample
+        # name -> (description, buckets, {labels: Histogram})
+        self.histograms = {}
+        self.errors = {}
+        self.collectors = []
+        self.callbacks = {}
+        self.lock = threading.Lock()
+        self.profile = None
+        self.profile_lock = threading.Lock()
+
+        self.declare('dash_callback_duration_seconds', 'Time spent in a Dash callback', latency_buckets)
+        self.declare('dash_callback_response_seconds',
+                     'Time from a Dash callback request to its encoded response', latency_buckets)
+        self.declare('dash_callback_response_bytes', 'Size of the JSON response of a Dash callback', size_buckets)
+
+    def declare(self, name, description, buckets):
+        self.histograms[name] = (description, buckets, {})
+
+    def observe(self, name, labels, value):
+        description, buckets, series = self.histograms[name]
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            if key not in series:
+                series[key] = Histogram(buckets)
+            series[key].observe(value)
+
+    def add_collector(self, collector):
+        # collector() returns (name, type, description, [(labels, value), ...]) tuples, read on every scrape
+        self.collectors.append(collector)
+        return collector
+
+    def callback(self, app):
+        # Drop-in for app.callback
+        def register(*args, **kwargs):
+            outputs = args[0] if args else kwargs['output']
+            label = '..'.join(str(output) for output in outputs) if isinstance(outputs, list) else str(outputs)
+
+            def decorator(func):
+                @functools.wraps(func)
+                def wrapper(*inputs):
+                    start = time.perf_counter()
+                    try:
+                        return self.call(func, inputs)
+                    except Exception:
+                        with self.lock:
+                            self.errors[label] = self.errors.get(label, 0) + 1
+                        raise
+                    finally:
+                        self.observe('dash_callback_duration_seconds', {'callback': label},
+                                     time.perf_counter() - start)
+
+                self.callbacks[label] = func.__name__
+                return app.callback(*args, **kwargs)(wrapper)
+
+            return decorator
+
+        return register
+
+    def call(self, func, inputs):
+        if not self.profile_sample or random.random() >= self.profile_sample:
+            return func(*inputs)
+        if not self.profile_lock.acquire(blocking=False):
+            return func(*inputs)
+        try:
+            profiler = cProfile.Profile()
+            result = profiler.runcall(func, *inputs)
+            with self.lock:
+                if self.profile is None:
+                    self.profile = pstats.Stats(profiler)
+                else:
+                    self.profile.add(profiler)
+            return result
+        finally:
+            self.profile_lock.release()
+
+    def start_request(self):
+        flask.g.metrics_start = time.perf_counter()
+
+    def record_response(self, response):
+        # Dash answers every callback on this route, the request names the output it is for
+        if flask.request.path.endswith('/_dash-update-component') and response.status_code == 200:
+            label = (flask.request.get_json(silent=True) or {}).get('output')
+            if label in self.callbacks:
+                self.observe('dash_callback_response_seconds', {'callback': label},
+                             time.perf_counter() - flask.g.metrics_start)
+                size = response.content_length
+                if size is None:
+                    size = len(response.get_data())
+                self.observe('dash_callback_response_bytes', {'callback': label}, size)
+        return response
+
+    def render(self):
+        lines = []
+        with self.lock:
+            for name, (description, buckets, series) in self.histograms.items():
+                lines += [f'# HELP {name} {description}', f'# TYPE {name} histogram']
+                for key, histogram in series.items():
+                    lines += histogram.lines(name, dict(key))
+            lines += ['# HELP dash_callback_errors_total Dash callback calls that raised',
+                      '# TYPE dash_callback_errors_total counter']
+            lines += [f'dash_callback_errors_total{format_labels({"callback": label})} {count}'
+                      for label, count in self.errors.items()]
+
+        for collector in self.collectors:
+            for name, kind, description, samples in collector():
+                lines += [f'# HELP {name} {description}', f'# TYPE {name} {kind}']
+                lines += [f'{name}{format_labels(labels)} {value}' for labels, value in samples]
+
+        return '\n'.join(lines) + '\n'
+
+    def render_profile(self, limit=50):
+        with self.lock:
+            if self.profile is None:
+                return 'No profile yet, set COVID_PROFILE_SAMPLE to a fraction of the calls to profile\n'
+            stream = io.StringIO()
+            self.profile.stream = stream
+            self.profile.sort_stats('cumulative').print_stats(limit)
+        return stream.getvalue()
+
+    def init_app(self, server):
+        server.before_request(self.start_request)
+        server.after_request(self.record_response)
+        server.add_url_rule('/metrics', 'metrics',
+                            lambda: flask.Response(self.render(), mimetype='text/plain; version=0.0.4'))
+        server.add_url_rule('/metrics/profile', 'metrics_profile',
+                            lambda: flask.Response(self.render_profile(), mimetype='text/plain'))
@@ -0,0 +1,75 @@
+# Figures built as plain dicts, for the charts carrying long arrays.
+#
+# go.Figure runs every property through Plotly's validators, copying every array on the way, and
+# serializing it walks the whole object tree again. A plain figure is the dict plotly.js reads:
+# traces, layout and frames are dicts, arrays stay NumPy arrays or pandas columns, and the dashboard
+# template is set in the layout, where go.Figure would add it when serialized. Nothing is checked,
+# a wrong property only shows in the browser, so the small figures keep using go.Figure.
+#
+# to_json encodes either kind. With orjson installed NumPy arrays are written by orjson itself, as
+# lists: the plotly.js bundled with dash-core-components predates the base64 typed arrays recent
+# plotly versions write. Without orjson it falls back to plotly's encoder. loads is the matching
+# decoder. JSONEncoder puts the same encoding behind the json.JSONEncoder interface, for Dash, which
+# encodes every callback response and layout with json.dumps(..., cls=plotly.utils.PlotlyJSONEncoder).
+import json
+
+import numpy as np
+import plotly.io as pio
+from plotly.basedatatypes import BaseFigure
+from plotly.utils import PlotlyJSONEncoder
+
+import theme
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# The dashboard template, as every go.Figure serializes it
+template = pio.templates[theme.name].to_plotly_json()
+
+
+def figure(data, layout=None, frames=None):
+    fig = {'data': list(data), 'layout': dict(layout or {}, template=template)}
+    if frames is not None:
+        fig['frames'] = list(frames)
+
+    return fig
+
+
+def encode(obj):
+    # What orjson does not write itself: pandas objects, arrays that are strided or not numeric, and
+    # Plotly figures and Dash components, which turn themselves into dicts
+    if hasattr(obj, 'to_numpy'):
+        return obj.to_numpy()
+    if isinstance(obj, np.ndarray):
+        if obj.dtype.kind in 'biufM':
+            return np.ascontiguousarray(obj)
+        return obj.tolist()
+    if hasattr(obj, 'to_plotly_json'):
+        return obj.to_plotly_json()
+    return PlotlyJSONEncoder().default(obj)
+
+
+def dumps(obj):
+    return orjson.dumps(obj, default=encode, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+
+
+def to_json(fig):
+    if orjson is None:
+        return pio.json.to_json_plotly(fig)
+    if isinstance(fig, BaseFigure):
+        fig = fig.to_dict()
+
+    return dumps(fig).decode('utf-8')
+
+
+class JSONEncoder(PlotlyJSONEncoder):
+    def encode(self, o):
+        if orjson is None:
+            return super().encode(o)
+        return dumps(o).decode('utf-8')
+
+
+def loads(text):
+    return orjson.loads(text) if orjson is not None else json.loads(text)
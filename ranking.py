@@ -0,0 +1,75 @@
+# Ranking of the countries in Data.data_global by each of its numeric columns, within every
+# continent and over all countries.
+#
+# Built once per data version: for every scope and metric, the row positions of the countries from
+# the highest value down, and the rank of Malaysia in them. A page of the ranking plus Malaysia is
+# then a slice of that order, with no sorting per request and nothing shared being modified.
+import threading
+
+import numpy as np
+
+all_countries = 'All countries'
+home_iso_code = 'MYS'
+
+
+class RankingIndex:
+    def __init__(self):
+        self.frame = None
+        self.home = np.empty(0, dtype=int)
+        self.metrics = []
+        self.orders = {}
+        self.home_ranks = {}
+        self.version = None
+        self.lock = threading.Lock()
+
+    def update(self, Data):
+        frame = Data.data_global.reset_index(drop=True)
+        scopes = {all_countries: np.arange(len(frame))}
+        scopes.update(frame.groupby('continent').indices)
+        home = np.flatnonzero(frame['iso_code'].to_numpy() == home_iso_code)
+        metrics = list(frame.select_dtypes('number').columns)
+
+        orders = {}
+        home_ranks = {}
+        for scope, positions in scopes.items():
+            for metric in metrics:
+                # Countries without a value go last
+                values = frame[metric].to_numpy(dtype=float)[positions]
+                order = positions[np.argsort(-values, kind='stable')]
+                order.flags.writeable = False
+                orders[(scope, metric)] = order
+                rank = np.flatnonzero(np.isin(order, home))
+                home_ranks[(scope, metric)] = int(rank[0]) if len(rank) else None
+
+        with self.lock:
+            # Published as a whole, readers never see a half-updated index
+            self.frame, self.home, self.metrics = frame, home, metrics
+            self.orders, self.home_ranks = orders, home_ranks
+            self.version = Data.version
+
+    def scopes(self):
+        return [all_countries] + sorted({scope for scope, metric in self.orders if scope != all_countries})
+
+    def size(self, scope):
+        return len(self.orders[(scope, self.metrics[0])])
+
+    def page(self, scope, metric, start, stop):
+        # Rows ranked start to stop - 1 (0-based) with a 1-based 'rank' column, plus Malaysia in its
+        # place when it is not among them. Malaysia outside the scope comes last, without a rank
+        with self.lock:
+            frame, home = self.frame, self.home
+            order, home_rank = self.orders[(scope, metric)], self.home_ranks[(scope, metric)]
+
+        positions = order[start:stop]
+        ranks = np.arange(start, start + len(positions)) + 1.0
+        if home_rank is None:
+            positions = np.concatenate([positions, home])
+            ranks = np.concatenate([ranks, np.full(len(home), np.nan)])
+        elif home_rank < start:
+            positions = np.concatenate([order[home_rank:home_rank + 1], positions])
+            ranks = np.concatenate([[home_rank + 1.0], ranks])
+        elif home_rank >= stop:
+            positions = np.concatenate([positions, order[home_rank:home_rank + 1]])
+            ranks = np.concatenate([ranks, [home_rank + 1.0]])
+
+        return frame.iloc[positions].assign(rank=ranks)
@@ -0,0 +1,90 @@
+# Background refresh of the dashboard data.
+#
+# A new snapshot is built off the request path on a fixed interval and swapped in with a single
+# reference assignment, so a request either sees the old snapshot or the new one, never a
+# half-built one. Snapshots are never modified once published. Listeners registered with
+# on_swap run after every swap, to invalidate whatever was derived from the previous snapshot.
+# A listener that fails is logged and does not stop the others, and the next refresh swaps the
+# same version in again until every listener has run on it.
+import logging
+import os
+import threading
+
+refresh_interval = int(os.environ.get('COVID_REFRESH_INTERVAL', 3600))
+
+# Until a first snapshot exists a failed build is retried much sooner than the refresh interval
+retry_interval = int(os.environ.get('COVID_REFRESH_RETRY', 30))
+
+logger = logging.getLogger(__name__)
+
+
+class DataRefresher:
+    def __init__(self, build, interval=refresh_interval):
+        self.build = build
+        self.interval = interval
+        self.snapshot = None
+        # The last version every listener ran on
+        self.swapped = None
+        self.listeners = []
+        self.ready = threading.Event()
+        self.refresh_lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def current(self):
+        return self.snapshot
+
+    def wait(self, timeout=None):
+        # Block until the first snapshot is in, returns None on timeout
+        self.ready.wait(timeout)
+        return self.snapshot
+
+    def on_swap(self, listener):
+        self.listeners.append(listener)
+        return listener
+
+    def swap(self, snapshot):
+        # Returns False when a listener failed
+        self.snapshot = snapshot
+        failed = False
+        for listener in self.listeners:
+            try:
+                listener(snapshot)
+            except Exception:
+                logger.exception('swap listener %r failed on data version %s', listener, snapshot.version)
+                failed = True
+        if not failed:
+            self.swapped = snapshot.version
+        self.ready.set()
+        return not failed
+
+    def refresh(self):
+        # Returns True when a new snapshot was swapped in, or the listeners that failed on the
+        # current one ran again
+        with self.refresh_lock:
+            snapshot = self.build()
+            if self.snapshot is not None and snapshot.version == self.swapped:
+                return False
+            self.swap(snapshot)
+        return True
+
+    def run(self):
+        # The first snapshot is built straight away, the app serves a loading page until then
+        while True:
+            try:
+                if self.refresh():
+                    logger.info('swapped in data version %s', self.snapshot.version)
+            except Exception:
+                # Keep serving the current snapshot and try again on the next tick
+                logger.exception('data refresh failed')
+            if self.stopped.wait(self.interval if self.snapshot is not None else retry_interval):
+                break
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run, name='data-refresher', daemon=True)
+            self.thread.start()
+        return self.thread
+
+    def stop(self):
+        self.stopped.set()
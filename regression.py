@@ -0,0 +1,78 @@
+# Linear regression with a bootstrap confidence band, in NumPy.
+#
+# Gives the same fit and band as seaborn's regplot: an ordinary least squares line, and the
+# percentile interval of the lines fitted to bootstrap resamples, evaluated on a grid spanning the
+# data. Resampling uses the Poisson bootstrap: every observation gets a Poisson(1) weight per
+# replicate, drawn from a generator seeded with the observation's key. Each replicate is then fully
+# described by five weighted sums, so a new day is folded in by adding its contribution to every
+# replicate and earlier days never have to be touched again.
+import threading
+
+import numpy as np
+
+
+class RegressionBand:
+    def __init__(self, n_boot=1000, ci=95, seed=0, grid_size=100):
+        self.n_boot = n_boot
+        self.ci = ci
+        self.seed = seed
+        self.grid_size = grid_size
+        self.points = {}
+        # Row 0 is the fit on the data itself, the others the replicates. Columns are the weighted
+        # sums of 1, x, y, x * x and x * y
+        self.sums = np.zeros((n_boot + 1, 5))
+        self.lock = threading.Lock()
+
+    def weights(self, key):
+        return np.random.default_rng([self.seed, key]).poisson(1, self.n_boot)
+
+    def reset(self):
+        self.points = {}
+        self.sums = np.zeros((self.n_boot + 1, 5))
+
+    def update(self, keys, x, y):
+        # keys: non-negative integers identifying the observations, e.g. day numbers. Only keys not
+        # seen before are folded in, a changed or missing old observation starts the fit over
+        keys = [int(key) for key in keys]
+        x = np.asarray(x, dtype=float)
+        y = np.asarray(y, dtype=float)
+        observed = dict(zip(keys, zip(x.tolist(), y.tolist())))
+
+        with self.lock:
+            if any(observed.get(key) != point for key, point in self.points.items()):
+                self.reset()
+
+            new = [key for key in keys if key not in self.points]
+            if new:
+                new_x = np.array([observed[key][0] for key in new])
+                new_y = np.array([observed[key][1] for key in new])
+                terms = np.column_stack([np.ones(len(new)), new_x, new_y, new_x * new_x, new_x * new_y])
+                weights = np.ones((len(new), self.n_boot + 1))
+                weights[:, 1:] = [self.weights(key) for key in new]
+                self.sums += weights.T @ terms
+                self.points.update((key, observed[key]) for key in new)
+
+        return len(new)
+
+    def coefficients(self):
+        # Intercept and slope of the fit and of every replicate
+        n, sx, sy, sxx, sxy = self.sums.T
+        with np.errstate(divide='ignore', invalid='ignore'):
+            slope = (n * sxy - sx * sy) / (n * sxx - sx * sx)
+            intercept = (sy - slope * sx) / n
+        return intercept, slope
+
+    def band(self):
+        # Grid, fitted line and lower and upper bounds of the band
+        with self.lock:
+            if len(self.points) < 2:
+                raise ValueError('at least two observations are needed for a regression')
+            xs = [point[0] for point in self.points.values()]
+            grid = np.linspace(min(xs), max(xs), self.grid_size)
+            intercept, slope = self.coefficients()
+
+        fitted = intercept[:, None] + slope[:, None] * grid
+        half = (100 - self.ci) / 2
+        low, high = np.nanpercentile(fitted[1:], [half, 100 - half], axis=0)
+
+        return grid, fitted[0], low, high
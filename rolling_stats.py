@@ -0,0 +1,134 @@
+# Rolling statistics of the daily series: 7 and 14-day means, week-on-week growth and a simple
+# reproduction number estimate, for the national series and every state.
+#
+# Each series keeps its days, values and statistics in preallocated NumPy buffers. When a new
+# snapshot comes in only its last revision_days already seen are compared with the stored ones, and
+# the statistics are recomputed from the first day that changed, from the 14 days before it on. A
+# series whose dates no longer line up with the stored ones is rebuilt from its first day. Tables
+# are built from the buffers when first asked for after an update.
+#
+# Rt is estimated from the growth of the 7-day mean as (mean_t / mean_t-7) ** (serial_interval / 7),
+# i.e. the daily growth rate compounded over one serial interval.
+import math
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+serial_interval = float(os.environ.get('COVID_SERIAL_INTERVAL', 5))
+
+statistics = ['mean_7', 'mean_14', 'growth_7', 'rt']
+
+# Days at the end of a series compared with the stored ones on every update, upstream revises the
+# last days it reported (see data_store.revision_days)
+revision_days = 14
+
+
+class SeriesStats:
+    def __init__(self, serial_interval=serial_interval):
+        self.serial_interval = serial_interval
+        self.reset()
+
+    def reset(self, capacity=1024):
+        self.n = 0
+        self.dates = np.empty(capacity, dtype='datetime64[ns]')
+        self.values = np.empty(capacity)
+        self.columns = {name: np.empty(capacity) for name in statistics}
+
+    def reserve(self, n):
+        # Grow the buffers to hold n days, doubling so that appending stays amortized O(1)
+        capacity = len(self.values)
+        if n <= capacity:
+            return
+        capacity = max(n, 2 * capacity)
+
+        def grow(buffer):
+            grown = np.empty(capacity, dtype=buffer.dtype)
+            grown[:self.n] = buffer[:self.n]
+            return grown
+
+        self.dates, self.values = grow(self.dates), grow(self.values)
+        self.columns = {name: grow(column) for name, column in self.columns.items()}
+
+    def update(self, dates, values):
+        # Bring the series in line with dates and values, returns how many days were recomputed
+        dates = np.asarray(dates, dtype='datetime64[ns]')
+        values = np.asarray(values, dtype=float)
+        n, seen = len(values), self.n
+
+        # Only the last revision_days seen are compared, earlier revisions go unnoticed
+        start = max(seen - revision_days, 0)
+        if n < seen or not np.array_equal(dates[start:seen], self.dates[start:seen]):
+            start = 0
+        else:
+            given, stored = values[start:seen], self.values[start:seen]
+            changed = np.flatnonzero((given != stored) & ~(np.isnan(given) & np.isnan(stored)))
+            start = start + changed[0] if len(changed) else seen
+
+        self.reserve(n)
+        self.dates[start:n] = dates[start:]
+        self.values[start:n] = values[start:]
+        self.n = n
+        self.compute(start)
+
+        return n - start
+
+    def compute(self, start):
+        # Statistics of the days from start on, the 14 days before it are all the windows reach back
+        n = self.n
+        if start >= n:
+            return
+        first = max(start - 14, 0)
+        sums = np.concatenate(([0.0], np.cumsum(self.values[first:n])))
+        days = np.arange(start, n)
+
+        for name, window in (('mean_7', 7), ('mean_14', 14)):
+            full = days[days >= window - 1]
+            column = self.columns[name]
+            column[start:n] = math.nan
+            column[full] = (sums[full + 1 - first] - sums[full + 1 - window - first]) / window
+
+        # NaN when there is no full week to compare with, or nothing to grow from
+        mean_7 = self.columns['mean_7']
+        previous = np.full(n - start, math.nan)
+        previous[days >= 7] = mean_7[days[days >= 7] - 7]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ratio = np.where(previous > 0, mean_7[start:n] / previous, math.nan)
+            self.columns['growth_7'][start:n] = (ratio - 1) * 100
+            self.columns['rt'][start:n] = ratio ** (self.serial_interval / 7)
+
+    def frame(self):
+        n = self.n
+        return pd.DataFrame(dict(date=self.dates[:n], value=self.values[:n],
+                                 **{name: column[:n] for name, column in self.columns.items()}))
+
+
+class RollingStats:
+    def __init__(self):
+        self.series = {}
+        self.tables = {}
+        self.version = None
+        self.lock = threading.Lock()
+
+    def update(self, Data):
+        national = Data.data.set_index('date')
+        by_state = Data.df_daily_bystate.set_index('date')
+        inputs = {('Malaysia', 'new_cases'): national['new_cases'], ('Malaysia', 'new_deaths'): national['new_deaths']}
+        for state in by_state.columns:
+            inputs[(state, 'new_cases')] = by_state[state]
+
+        with self.lock:
+            for key, values in inputs.items():
+                stats = self.series.setdefault(key, SeriesStats())
+                stats.update(values.index.to_numpy(), values.to_numpy())
+            # Readers never see a half-updated set, tables are built again from the updated series
+            self.tables = {}
+            self.version = Data.version
+
+    def table(self, region, metric):
+        key = (region, metric)
+        with self.lock:
+            if key not in self.tables:
+                self.tables[key] = self.series[key].frame()
+            return self.tables[key]
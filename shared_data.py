@@ -0,0 +1,185 @@
+# One data snapshot shared by every gunicorn worker.
+#
+# With COVID_SHARED_DATA_DIR set (ideally on tmpfs such as /dev/shm), a single loader process
+# builds the snapshot and writes its frames as uncompressed Arrow IPC files under
+# <dir>/<version>/. Workers memory-map those files instead of downloading and parsing the data
+# themselves, so the page cache holds one copy of the arrays however many workers run. The loader
+# also fits the forecasts of every version once and writes them to <dir>/<version>/forecasts.arrow
+# when they are done, the workers load them from there.
+#
+#   python shared_data.py    run the loader on its own (gunicorn.conf.py starts it automatically)
+import json
+import logging
+import os
+import shutil
+import subprocess
+import sys
+import time
+import uuid
+
+import data_cache
+
+shared_data_dir = os.environ.get('COVID_SHARED_DATA_DIR')
+
+# How often workers look for a newer export, attaching is cheap so this can be short
+poll_interval = int(os.environ.get('COVID_SHARED_DATA_POLL', 60))
+
+logger = logging.getLogger(__name__)
+
+
+def export(data, directory):
+    import pandas as pd
+    import pyarrow as pa
+
+    # Write every frame of the snapshot, then point <dir>/current at it
+    os.makedirs(directory, exist_ok=True)
+    scratch_dir = os.path.join(directory, '.tmp-' + uuid.uuid4().hex)
+    os.makedirs(scratch_dir)
+
+    frames = [name for name, value in vars(data).items() if isinstance(value, pd.DataFrame)]
+    for name in frames:
+        table = pa.Table.from_pandas(getattr(data, name))
+        with pa.OSFile(os.path.join(scratch_dir, name + '.arrow'), 'wb') as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+    with open(os.path.join(scratch_dir, 'meta.json'), 'w') as f:
+        json.dump({'version': data.version, 'frames': frames}, f)
+
+    version_dir = os.path.join(directory, data.version)
+    if os.path.exists(version_dir):
+        shutil.rmtree(scratch_dir)
+    else:
+        os.rename(scratch_dir, version_dir)
+
+    previous = read_current(directory)
+    data_cache.write_atomic(os.path.join(directory, 'current'), data.version.encode('utf-8'))
+
+    # Workers may still be attached to the previous export, mappings of unlinked files stay valid
+    for entry in os.listdir(directory):
+        if entry not in (data.version, previous, 'current'):
+            shutil.rmtree(os.path.join(directory, entry), ignore_errors=True)
+
+
+def export_forecasts(frame, version, directory):
+    import pyarrow as pa
+
+    # Written next to the export of its version, renamed into place once complete
+    path = os.path.join(directory, version, 'forecasts.arrow')
+    scratch = os.path.join(directory, version, '.tmp-' + uuid.uuid4().hex)
+    table = pa.Table.from_pandas(frame, preserve_index=False)
+    with pa.OSFile(scratch, 'wb') as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(scratch, path)
+
+
+def read_forecasts(directory, version):
+    # The forecasts fitted by the loader for version, None until they are written
+    import pyarrow as pa
+
+    try:
+        with pa.OSFile(os.path.join(directory, version, 'forecasts.arrow')) as source:
+            return pa.ipc.open_file(source).read_all().to_pandas()
+    except FileNotFoundError:
+        return None
+
+
+def read_current(directory):
+    try:
+        with open(os.path.join(directory, 'current')) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def attach(directory, version):
+    import pyarrow as pa
+
+    import data_preprocess
+
+    version_dir = os.path.join(directory, version)
+    with open(os.path.join(version_dir, 'meta.json')) as f:
+        meta = json.load(f)
+
+    frames = {}
+    for name in meta['frames']:
+        source = pa.memory_map(os.path.join(version_dir, name + '.arrow'))
+        table = pa.ipc.open_file(source).read_all()
+        # One block per column lets numeric columns without nulls point straight into the mapping
+        frames[name] = table.to_pandas(split_blocks=True)
+
+    return data_preprocess.Data.from_frames(frames, meta['version'])
+
+
+class Reader:
+    # Snapshot builder for refresher.DataRefresher that attaches the loader's latest export
+    def __init__(self, directory, timeout=600):
+        self.directory = directory
+        self.timeout = timeout
+        self.data = None
+
+    def __call__(self):
+        deadline = time.monotonic() + self.timeout
+        version = read_current(self.directory)
+        while version is None:
+            if time.monotonic() > deadline:
+                raise TimeoutError(f'no data exported to {self.directory}')
+            time.sleep(1)
+            version = read_current(self.directory)
+
+        if self.data is None or self.data.version != version:
+            self.data = attach(self.directory, version)
+        return self.data
+
+
+def start_loader(directory, timeout=600):
+    # Run the loader in its own process and wait for its first export. A pointer left by an earlier
+    # run is removed first, workers would attach that old export, whose files the new loader is
+    # about to delete
+    try:
+        os.unlink(os.path.join(directory, 'current'))
+    except FileNotFoundError:
+        pass
+    process = subprocess.Popen([sys.executable, os.path.abspath(__file__)],
+                               env=dict(os.environ, COVID_SHARED_DATA_DIR=directory))
+    deadline = time.monotonic() + timeout
+    while read_current(directory) is None:
+        if process.poll() is not None:
+            raise RuntimeError(f'data loader exited with status {process.returncode}')
+        if time.monotonic() > deadline:
+            process.terminate()
+            raise TimeoutError('data loader did not export a snapshot in time')
+        time.sleep(0.5)
+
+    return process
+
+
+def run_loader(directory):
+    import data_preprocess
+    import forecasting
+    import refresher
+
+    loader = refresher.DataRefresher(data_preprocess.Data)
+    forecaster = forecasting.Forecaster()
+
+    @loader.on_swap
+    def export_snapshot(data):
+        export(data, directory)
+        logger.info('exported data version %s to %s', data.version, directory)
+
+    @loader.on_swap
+    def fit_forecasts(data):
+        # After the snapshot is out, workers serve it while the models are fitted
+        forecaster.fit(data)
+        if forecaster.version == data.version:
+            export_forecasts(forecaster.frame(), data.version, directory)
+            logger.info('exported forecasts of data version %s', data.version)
+
+    loader.run()
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    if not shared_data_dir:
+        sys.exit('COVID_SHARED_DATA_DIR is not set')
+    run_loader(shared_data_dir)
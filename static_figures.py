@@ -0,0 +1,83 @@
+# Figures too heavy to build in a callback.
+#
+# Each one is built once per data version, serialized and gzip-compressed, and served from
+# /figures/<name>.json under the app's routes prefix with an ETag so browsers only download it again
+# after the data changed.
+# Requests and builds are counted in the same RenderStats as the callback figures.
+import gzip
+import hashlib
+import threading
+
+import flask
+
+import figure_cache
+import plain_figure
+
+
+class StaticFigures:
+    def __init__(self, stats=None):
+        self.stats = stats if stats is not None else figure_cache.RenderStats()
+        self.builders = {}
+        self.artifacts = {}
+        self.version = None
+        self.lock = threading.Lock()
+
+    def register(self, name):
+        def decorator(func):
+            self.builders[name] = func
+            return func
+
+        return decorator
+
+    def url(self, name):
+        # Relative to the root of the app
+        return f'/figures/{name}.json'
+
+    def build(self, name, version):
+        body = plain_figure.to_json(self.builders[name]()).encode('utf-8')
+        etag = f'{version}-{hashlib.sha1(body).hexdigest()[:12]}'
+        return {'etag': etag, 'gzip': gzip.compress(body, compresslevel=9), 'size': len(body)}
+
+    def get(self, name, requested=True):
+        with self.lock:
+            artifact = self.artifacts.get(name)
+            rendered = artifact is None or artifact['version'] != self.version
+            if rendered:
+                artifact = dict(self.build(name, self.version), version=self.version)
+                self.artifacts[name] = artifact
+        self.stats.count(name, rendered, requested)
+        return artifact
+
+    def set_version(self, version):
+        with self.lock:
+            self.version = version
+
+    def publish(self):
+        for name in list(self.builders):
+            self.get(name, requested=False)
+
+    def publish_in_background(self):
+        thread = threading.Thread(target=self.publish, name='static-figures-publish', daemon=True)
+        thread.start()
+        return thread
+
+    def serve(self, name):
+        if name not in self.builders:
+            flask.abort(404)
+        artifact = self.get(name)
+
+        if artifact['etag'] in flask.request.if_none_match:
+            response = flask.Response(status=304)
+        elif 'gzip' in flask.request.accept_encodings:
+            response = flask.Response(artifact['gzip'], mimetype='application/json')
+            response.headers['Content-Encoding'] = 'gzip'
+        else:
+            response = flask.Response(gzip.decompress(artifact['gzip']), mimetype='application/json')
+
+        response.set_etag(artifact['etag'])
+        response.headers['Cache-Control'] = 'public, no-cache'
+        response.vary.add('Accept-Encoding')
+        return response
+
+    def init_app(self, server, prefix='/'):
+        server.add_url_rule(prefix + 'figures/<name>.json', 'static_figures', self.serve)
@@ -0,0 +1,41 @@
+import numpy as np
+import pandas as pd
+
+import anomalies
+
+
+def cumulative(daily):
+    dates = pd.date_range('2021-01-01', periods=len(daily))
+    return pd.DataFrame(daily, index=dates).cumsum()
+
+
+def test_spread_keeps_column_totals():
+    rng = np.random.default_rng(0)
+    daily = rng.poisson(100, (60, 3)).astype(float)
+    # Backlogs reported at once
+    daily[20, 0] += 5000
+    daily[45, 1] += 3000
+    table = cumulative(daily)
+
+    corrected, corrections = anomalies.correct(table, outliers='spread')
+
+    assert set(corrections[corrections.kind == 'outlier'].state) == {0, 1}
+    assert corrected.iloc[20, 0] < 1000
+    np.testing.assert_array_equal(corrected.sum().to_numpy(), table.diff().fillna(0).sum().to_numpy())
+
+
+def test_spread_near_the_start_uses_the_days_there_are():
+    daily = pd.DataFrame({'a': [0.0, 10, 10, 310, 10, 10]})
+    excess = pd.DataFrame({'a': [0.0, 0, 0, 300, 0, 0]})
+
+    spread = anomalies.spread_excess(daily, excess)
+
+    assert spread['a'].tolist() == [100, 110, 110, 10, 10, 10]
+    assert spread['a'].sum() == daily['a'].sum()
+
+
+def test_spread_leaves_the_first_day_alone():
+    daily = pd.DataFrame({'a': [500.0, 10, 10]})
+    excess = pd.DataFrame({'a': [490.0, 0, 0]})
+
+    assert anomalies.spread_excess(daily, excess)['a'].tolist() == [500, 10, 10]
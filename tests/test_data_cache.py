@@ -0,0 +1,117 @@
+import http.server
+import os
+import threading
+
+import pytest
+
+import data_cache
+
+BODY = b'date,total_cases\n2021-01-01,1\n'
+ETAG = '"v1"'
+LAST_MODIFIED = 'Fri, 01 Jan 2021 00:00:00 GMT'
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    # Serves BODY with validators, answers 304 when they match. With truncate set the connection is
+    # closed halfway through a body announced in full
+    def do_GET(self):
+        self.server.requests.append(dict(self.headers))
+        if self.headers.get('If-None-Match') == ETAG:
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('ETag', ETAG)
+        self.send_header('Last-Modified', LAST_MODIFIED)
+        self.send_header('Content-Length', str(len(self.server.body)))
+        self.end_headers()
+        if self.server.truncate:
+            self.wfile.write(self.server.body[:len(self.server.body) // 2])
+            self.wfile.flush()
+            self.close_connection = True
+        else:
+            self.wfile.write(self.server.body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    httpd.requests = []
+    httpd.body = BODY
+    httpd.truncate = False
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(data_cache, 'CACHE_DIR', str(tmp_path / 'cache'))
+    return tmp_path / 'cache'
+
+
+def url(server):
+    return f'http://127.0.0.1:{server.server_address[1]}/owid-covid-data.csv'
+
+
+def read(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def test_revalidates_and_keeps_the_cached_copy_on_304(server):
+    path = data_cache.fetch(url(server), ttl=0)
+    assert read(path) == BODY
+    assert 'If-None-Match' not in server.requests[0]
+
+    mtime = os.stat(path).st_mtime_ns
+    assert data_cache.fetch(url(server), ttl=0) == path
+    assert server.requests[1]['If-None-Match'] == ETAG
+    assert server.requests[1]['If-Modified-Since'] == LAST_MODIFIED
+    assert read(path) == BODY
+    assert os.stat(path).st_mtime_ns == mtime
+
+
+def test_within_ttl_makes_no_request(server):
+    data_cache.fetch(url(server), ttl=3600)
+    data_cache.fetch(url(server), ttl=3600)
+    assert len(server.requests) == 1
+
+
+def test_serves_stale_copy_when_unreachable(server):
+    path = data_cache.fetch(url(server), ttl=0)
+    address = url(server)
+    server.shutdown()
+    server.server_close()
+
+    assert data_cache.fetch(address, ttl=0) == path
+    assert read(path) == BODY
+
+
+def test_unreachable_without_a_copy_raises(server):
+    address = url(server)
+    server.shutdown()
+    server.server_close()
+
+    with pytest.raises(OSError):
+        data_cache.fetch(address, ttl=0)
+
+
+def test_interrupted_download_leaves_no_partial_file(server, cache_dir):
+    path = data_cache.fetch(url(server), ttl=0)
+    meta = read(path + '.meta.json')
+
+    # The source changed, its download breaks off halfway
+    server.body = BODY + b'2021-01-02,2\n'
+    server.truncate = True
+    with open(path + '.meta.json', 'w') as f:
+        f.write(meta.decode('utf-8').replace(ETAG.replace('"', '\\"'), '\\"v0\\"'))
+
+    assert data_cache.fetch(url(server), ttl=0) == path
+    assert read(path) == BODY
+    assert not [f for f in os.listdir(cache_dir) if f.startswith('.tmp-')]
@@ -0,0 +1,90 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+import data_preprocess
+import data_store
+
+
+def vaccination(rows):
+    # rows: (date, people_vaccinated, people_fully_vaccinated)
+    df = pd.DataFrame(rows, columns=['date', 'people_vaccinated', 'people_fully_vaccinated'])
+    df['population'] = 1000.0
+    data = data_preprocess.Data.__new__(data_preprocess.Data)
+    return data.get_vaccination_by_date(df).set_index('date')
+
+
+def test_vaccination_fills_each_count_from_its_own_reports():
+    table = vaccination([('2021-03-02', 100, 10),
+                         ('2021-03-03', 110, np.nan),
+                         ('2021-03-05', 0, 30),
+                         ('2021-03-06', 150, 0),
+                         ('2021-03-07', 160, 60)])
+
+    assert list(table.index) == list(pd.date_range('2021-03-02', '2021-03-07'))
+    assert table.loc['2021-03-03', 'people_fully_vaccinated'] == 10
+    assert table.loc['2021-03-03', '1st_dose_vaccinated'] == 100
+    assert table.loc['2021-03-05', 'unvaccinated'] == 1000 - 150
+    assert table.loc['2021-03-06', 'people_fully_vaccinated'] == 60
+    assert (table[['people_fully_vaccinated', 'unvaccinated', '1st_dose_vaccinated']] > 0).all().all()
+
+
+def test_vaccination_range_starts_at_the_first_report():
+    table = vaccination([('2021-03-02', 0, 0),
+                         ('2021-03-03', np.nan, 5),
+                         ('2021-03-04', 100, np.nan)])
+
+    assert table.index[0] == pd.Timestamp('2021-03-03')
+    assert table.loc['2021-03-03', '1st_dose_vaccinated'] == 95
+
+
+def test_latest_by_country_reads_back_as_far_as_a_column_was_reported(tmp_path, monkeypatch):
+    monkeypatch.setattr(data_store, 'STORE_DIR', str(tmp_path / 'store'))
+    dates = pd.date_range('2021-01-01', periods=500).strftime('%Y-%m-%d')
+    rows = []
+    for iso_code, continent in [('AAA', 'Asia'), ('BBB', 'Europe'), ('CCC', 'Africa'), ('OWID_WRL', np.nan)]:
+        for day, date in enumerate(dates):
+            rows.append({'iso_code': iso_code, 'continent': continent, 'location': iso_code, 'date': date,
+                         'total_cases': float(day), 'total_deaths': float(day) / 10,
+                         'people_vaccinated': float(day) * 2, 'people_fully_vaccinated': float(day),
+                         'population': 1e6})
+    df = pd.DataFrame(rows)
+    # BBB stopped reporting vaccinations 100 days before its last date, CCC never reported full doses
+    df.loc[(df.iso_code == 'BBB') & (df.date >= dates[-100]), 'people_vaccinated'] = np.nan
+    df.loc[df.iso_code == 'CCC', 'people_fully_vaccinated'] = np.nan
+    path = str(tmp_path / 'owid.csv')
+    df.to_csv(path, index=False)
+    data_store.refresh('owid', path, 'date', '%Y-%m-%d', key_column='iso_code')
+
+    data = data_preprocess.Data.__new__(data_preprocess.Data)
+    latest = data.load_latest_by_country()
+
+    pd.testing.assert_frame_equal(latest, data.latest_by_country(data_store.load('owid')))
+    assert latest.set_index('iso_code').loc['BBB', 'people_vaccinated'] == 399 * 2
+    assert len(data_store.load_recent('owid', 30)) == 4 * 30
+
+
+def test_vaccination_without_reports_is_empty():
+    table = vaccination([('2021-03-02', 0, 0), ('2021-03-03', np.nan, np.nan)])
+
+    assert table.empty
+    assert list(table.columns) == ['people_fully_vaccinated', 'unvaccinated', '1st_dose_vaccinated']
+    assert vaccination([]).empty
+
+
+def test_version_follows_the_region_table(tmp_path):
+    data = data_preprocess.Data.__new__(data_preprocess.Data)
+    manifests = [{'signature': '10-1'}, {'signature': '20-2'}]
+    first, second = tmp_path / 'regions.csv', tmp_path / 'districts.csv'
+    for path in (first, second):
+        path.write_text('key,name\n')
+    os.utime(first, ns=(1, 1))
+    os.utime(second, ns=(1, 1))
+
+    version = data.get_version(manifests, str(first))
+    assert data.get_version(manifests, str(first)) == version
+    assert data.get_version(manifests, str(second)) != version
+    first.write_text('key,name\na,A\n')
+    os.utime(first, ns=(1, 1))
+    assert data.get_version(manifests, str(first)) != version
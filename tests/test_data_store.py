@@ -0,0 +1,77 @@
+import os
+
+import pandas as pd
+import pytest
+
+import data_store
+
+
+@pytest.fixture(autouse=True)
+def store_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(data_store, 'STORE_DIR', str(tmp_path / 'store'))
+
+
+def owid(rows):
+    # rows: (iso_code, date, total_cases)
+    return pd.DataFrame(rows, columns=['iso_code', 'date', 'total_cases'])
+
+
+def refresh(tmp_path, df, mtime):
+    path = str(tmp_path / 'owid.csv')
+    df.to_csv(path, index=False)
+    os.utime(path, ns=(mtime, mtime))
+    return data_store.refresh('owid', path, 'date', '%Y-%m-%d', key_column='iso_code')
+
+
+def stored(df=None):
+    df = data_store.load('owid') if df is None else df
+    return df.sort_values(['iso_code', 'date']).reset_index(drop=True)
+
+
+def days(iso_code, first, last, cases=lambda day: day):
+    return [(iso_code, f'2021-01-{day:02d}', cases(day)) for day in range(first, last + 1)]
+
+
+def test_late_reporting_key_is_appended(tmp_path):
+    refresh(tmp_path, owid(days('AAA', 1, 20) + days('BBB', 1, 5)), 1)
+    # BBB reports its missing days after AAA has moved on
+    source = owid(days('AAA', 1, 21) + days('BBB', 1, 21))
+    manifest = refresh(tmp_path, source, 2)
+
+    assert manifest['last_dates'] == {'AAA': '2021-01-21T00:00:00', 'BBB': '2021-01-21T00:00:00'}
+    pd.testing.assert_frame_equal(stored(), stored(source))
+
+
+def test_revised_rows_replace_stored_ones(tmp_path):
+    refresh(tmp_path, owid(days('AAA', 1, 20)), 1)
+    source = owid(days('AAA', 1, 21, cases=lambda day: day * 10 if day > 15 else day))
+    refresh(tmp_path, source, 2)
+
+    pd.testing.assert_frame_equal(stored(), stored(source))
+    columns = data_store.load('owid', columns=['total_cases'])
+    assert list(columns.columns) == ['total_cases']
+    assert sorted(columns.total_cases) == sorted(source.total_cases)
+
+
+def test_backfill_before_revision_window_rebuilds(tmp_path):
+    generation = refresh(tmp_path, owid(days('AAA', 1, 20) + days('BBB', 1, 10) + days('BBB', 30, 30)),
+                         1)['generation']
+    # BBB days older than the revision window of its last date show up
+    source = owid(days('AAA', 1, 20) + days('BBB', 1, 30))
+    manifest = refresh(tmp_path, source, 2)
+
+    assert manifest['generation'] != generation
+    pd.testing.assert_frame_equal(stored(), stored(source))
+
+
+def test_compaction_drops_rewritten_rows(tmp_path):
+    for last in range(10, 20):
+        # The latest days are revised on every refresh
+        source = owid(days('AAA', 1, last, cases=lambda day: day * last if day > last - 5 else day))
+        manifest = refresh(tmp_path, source, last)
+        pd.testing.assert_frame_equal(stored(), stored(source))
+
+    manifest = data_store.compact('owid', manifest)
+    assert not manifest['revised']
+    assert data_store.open_dataset('owid', manifest).count_rows() == len(source)
+    pd.testing.assert_frame_equal(stored(), stored(source))
@@ -0,0 +1,43 @@
+import numpy as np
+import pandas as pd
+
+import downsample
+
+
+def noisy(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return np.arange(n, dtype=float), rng.normal(0, 1, n).cumsum()
+
+
+def test_lttb_keeps_first_and_last_and_returns_threshold_points():
+    x, y = noisy(5000)
+    for threshold in (3, 10, 1200, 4999):
+        selected = downsample.lttb(x, y, threshold)
+        assert len(selected) == threshold
+        assert selected[0] == 0 and selected[-1] == len(x) - 1
+        assert (np.diff(selected) > 0).all()
+
+
+def test_lttb_returns_short_input_unchanged():
+    x, y = noisy(100)
+    for threshold in (100, 101, 1000):
+        np.testing.assert_array_equal(downsample.lttb(x, y, threshold), np.arange(100))
+
+
+def test_lttb_keeps_a_spike():
+    x, y = np.arange(1000, dtype=float), np.zeros(1000)
+    y[537] = 100
+    assert 537 in downsample.lttb(x, y, 50)
+
+
+def test_series_cuts_to_the_visible_range():
+    dates = pd.date_range('2021-01-01', periods=365)
+    values = np.arange(365, dtype=float)
+    values[:6] = np.nan
+
+    kept_dates, kept_values = downsample.series(dates, values, '2021-03-01', '2021-03-31', width=1200)
+
+    # One day either side of the range, every day kept at this width
+    assert kept_dates[0] == np.datetime64('2021-02-28') and kept_dates[-1] == np.datetime64('2021-04-01')
+    assert len(kept_values) == 33
+    assert np.isfinite(downsample.series(dates, values)[1]).all()
@@ -0,0 +1,22 @@
+import figure_cache
+
+
+def test_warm_renders_are_counted_apart_from_requests():
+    stats = figure_cache.RenderStats()
+    figures = figure_cache.FigureCache(stats=stats)
+    builds = []
+
+    @figures.memoize('chart', domain=lambda: [(1,), (2,)])
+    def chart(value):
+        builds.append(value)
+        return {'data': [{'type': 'bar', 'y': [value]}], 'layout': {}}
+
+    figures.set_version('v1')
+    figures.warm()
+    stats.page_view()
+    assert chart(1) == chart(1)
+    chart(3)
+
+    assert builds == [1, 2, 3]
+    assert stats.report() == {'page_views': 1, 'figures': {'chart': {
+        'requests': 3, 'renders': 1, 'warm_renders': 2, 'renders_per_page_view': 1.0}}}
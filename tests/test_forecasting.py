@@ -0,0 +1,78 @@
+import types
+
+import pandas as pd
+import pytest
+
+import forecasting
+
+
+def snapshot(version):
+    return types.SimpleNamespace(version=version)
+
+
+def forecasts():
+    dates = pd.date_range('2021-06-01', periods=3)
+    return {('rolling-linear', 'Malaysia', 'new_cases'): pd.Series([1.0, 2.0, 3.0], index=dates),
+            ('rolling-linear', 'johor', 'new_cases'): pd.Series([4.0, 5.0, 6.0], index=dates)}
+
+
+def test_frame_round_trip():
+    forecaster = forecasting.Forecaster()
+    forecaster.request('v1')
+    forecaster.publish('v1', forecasts())
+
+    loaded = forecaster.from_frame(forecaster.frame())
+    assert loaded.keys() == forecasts().keys()
+    for key, forecast in forecasts().items():
+        pd.testing.assert_series_equal(loaded[key], forecast, check_names=False, check_freq=False)
+
+
+def test_loads_fits_made_elsewhere_once_they_exist(monkeypatch):
+    monkeypatch.setattr(forecasting, 'fits_poll_interval', 0)
+    source = forecasting.Forecaster()
+    source.request('v1')
+    source.publish('v1', forecasts())
+
+    calls = []
+
+    def fits(version):
+        calls.append(version)
+        return source.frame() if len(calls) > 2 else None
+
+    forecaster = forecasting.Forecaster(fits=fits)
+    forecaster.update_in_background(snapshot('v1')).join(5)
+
+    assert calls == ['v1'] * 3
+    assert forecaster.version == 'v1'
+    assert list(forecaster.get('rolling-linear', 'johor', 'new_cases', '2021-06-02')) == [4.0, 5.0]
+
+
+def test_stops_waiting_when_a_newer_version_comes_in(monkeypatch):
+    monkeypatch.setattr(forecasting, 'fits_poll_interval', 0)
+    forecaster = forecasting.Forecaster(fits=lambda version: None)
+    thread = forecaster.update_in_background(snapshot('v1'))
+    forecaster.request('v2')
+    thread.join(5)
+
+    assert not thread.is_alive()
+    assert forecaster.version is None
+
+
+def test_fits_here_when_the_fits_never_come(monkeypatch):
+    monkeypatch.setattr(forecasting, 'fits_poll_interval', 0)
+    monkeypatch.setattr(forecasting, 'fits_timeout', 0)
+    forecaster = forecasting.Forecaster(fits=lambda version: None)
+    monkeypatch.setattr(forecaster, 'fit_all', lambda Data: forecasts())
+    forecaster.update_in_background(snapshot('v1')).join(5)
+
+    assert forecaster.version == 'v1'
+    assert forecaster.get('rolling-linear', 'Malaysia', 'new_cases', '2021-06-03').tolist() == [1.0, 2.0, 3.0]
+
+
+def test_models_implement_fit_and_predict():
+    class Incomplete(forecasting.Model):
+        def fit(self, values):
+            return self
+
+    with pytest.raises(TypeError):
+        Incomplete()
@@ -0,0 +1,48 @@
+import numpy as np
+
+import geojson_tools
+
+
+def feature(name, ring):
+    return {'type': 'Feature', 'properties': {'name': name, 'other': 1},
+            'geometry': {'type': 'Polygon', 'coordinates': [ring + ring[:1]]}}
+
+
+def states():
+    # Two states sharing a wiggly border from (1, 0) up to (1, 1), with noise simplification removes
+    rng = np.random.default_rng(0)
+    y = np.linspace(0, 1, 400)
+    x = 1 + 0.05 * np.sin(6 * np.pi * y) + rng.normal(0, 0.0005, len(y))
+    x[[0, -1]] = 1
+    border = [[float(a), float(b)] for a, b in zip(x, y)]
+    west = [[0.0, 1.0], [0.0, 0.0]] + border
+    east = [[2.0, 0.0], [2.0, 1.0]] + border[::-1]
+    return {'type': 'FeatureCollection', 'features': [feature('west', west), feature('east', east)]}
+
+
+def ring(feature):
+    return [tuple(p) for p in feature['geometry']['coordinates'][0][:-1]]
+
+
+def run(points, shared):
+    # The points of the ring on the shared border, in ring order, starting after the last point off it
+    start = next(i for i, p in enumerate(points) if p not in shared and points[(i + 1) % len(points)] in shared)
+    ordered = points[start + 1:] + points[:start + 1]
+    return [p for p in ordered if p in shared]
+
+
+def test_neighbours_keep_the_same_simplified_border():
+    west, east = (ring(f) for f in geojson_tools.prepare(states())['features'])
+    shared = set(west) & set(east)
+
+    # The border is simplified, but both states still have every point of it, in opposite directions
+    assert 5 < len(shared) < 100
+    assert run(west, shared) == run(east, shared)[::-1]
+    # No points of one state near the border that the other lacks
+    assert all(p in shared for p in west if p[0] > 0.5)
+    assert all(p in shared for p in east if p[0] < 1.5)
+
+
+def test_only_the_name_property_is_kept():
+    features = geojson_tools.prepare(states())['features']
+    assert [f['properties'] for f in features] == [{'name': 'west'}, {'name': 'east'}]
@@ -0,0 +1,65 @@
+import types
+
+import numpy as np
+import pandas as pd
+
+import ranking
+
+
+def index(rows):
+    # rows: (iso_code, continent, total_cases)
+    frame = pd.DataFrame(rows, columns=['iso_code', 'continent', 'total_cases'])
+    frame['location'] = frame.iso_code
+    ranks = ranking.RankingIndex()
+    ranks.update(types.SimpleNamespace(data_global=frame, version='v1'))
+    return ranks
+
+
+def page(ranks, scope, start, stop):
+    rows = ranks.page(scope, 'total_cases', start, stop)
+    return list(zip(rows.iso_code, rows['rank']))
+
+
+def countries(n, continent='Asia'):
+    return [('C%02d' % i, continent, float(100 - i)) for i in range(n)]
+
+
+def test_page_adds_malaysia_in_its_place():
+    ranks = index(countries(12) + [('MYS', 'Asia', 95.5)])
+
+    # Ranked 6th, after the first page
+    assert page(ranks, 'Asia', 0, 3) == [('C00', 1), ('C01', 2), ('C02', 3), ('MYS', 6)]
+    assert page(ranks, 'Asia', 3, 6)[-1] == ('MYS', 6)
+    assert len(page(ranks, 'Asia', 3, 6)) == 3
+    assert page(ranks, 'Asia', 10, 13)[0] == ('MYS', 6)
+
+
+def test_page_at_the_end_of_the_ranking():
+    ranks = index(countries(12) + [('MYS', 'Asia', 1000.0)])
+
+    assert page(ranks, 'Asia', 10, 20) == [('MYS', 1), ('C09', 11), ('C10', 12), ('C11', 13)]
+    assert page(ranks, 'Asia', 20, 30) == [('MYS', 1)]
+
+
+def test_ties_keep_the_order_of_the_data():
+    ranks = index([('AAA', 'Asia', 5.0), ('BBB', 'Asia', 7.0), ('CCC', 'Asia', 5.0), ('MYS', 'Asia', 5.0)])
+
+    assert page(ranks, 'Asia', 0, 4) == [('BBB', 1), ('AAA', 2), ('CCC', 3), ('MYS', 4)]
+
+
+def test_missing_values_go_last():
+    ranks = index([('AAA', 'Asia', np.nan), ('BBB', 'Asia', 1.0), ('MYS', 'Asia', 2.0)])
+
+    assert [iso_code for iso_code, rank in page(ranks, 'Asia', 0, 3)] == ['MYS', 'BBB', 'AAA']
+
+
+def test_scope_filters_the_countries():
+    ranks = index(countries(3) + [('EU1', 'Europe', 500.0), ('MYS', 'Asia', 0.5)])
+
+    assert ranks.scopes() == [ranking.all_countries, 'Asia', 'Europe']
+    assert ranks.size('Europe') == 1
+    # Malaysia is not in Europe, it comes last without a rank
+    rows = page(ranks, 'Europe', 0, 10)
+    assert rows[0] == ('EU1', 1)
+    assert rows[1][0] == 'MYS' and np.isnan(rows[1][1])
+    assert page(ranks, ranking.all_countries, 0, 2) == [('EU1', 1), ('C00', 2), ('MYS', 5)]
@@ -0,0 +1,42 @@
+import types
+
+import refresher
+
+
+def build(versions):
+    versions = iter(versions)
+    return lambda: types.SimpleNamespace(version=next(versions))
+
+
+def test_a_failing_listener_does_not_stop_the_others():
+    data = refresher.DataRefresher(build(['v1']))
+    seen = []
+
+    @data.on_swap
+    def fail(snapshot):
+        raise RuntimeError('listener failed')
+
+    data.on_swap(lambda snapshot: seen.append(snapshot.version))
+
+    assert data.refresh()
+    assert seen == ['v1']
+    assert data.current().version == 'v1'
+    assert data.ready.is_set()
+    assert data.swapped is None
+
+
+def test_next_refresh_retries_a_failed_swap():
+    data = refresher.DataRefresher(build(['v1', 'v1', 'v1']))
+    calls = []
+
+    @data.on_swap
+    def flaky(snapshot):
+        calls.append(snapshot.version)
+        if len(calls) == 1:
+            raise RuntimeError('listener failed')
+
+    assert data.refresh()
+    assert data.refresh()
+    assert data.swapped == 'v1'
+    assert not data.refresh()
+    assert calls == ['v1', 'v1']
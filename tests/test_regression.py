@@ -0,0 +1,47 @@
+import numpy as np
+
+import regression
+
+
+def sample(n=200, seed=0):
+    rng = np.random.default_rng(seed)
+    x = rng.uniform(0, 1000, n)
+    return np.arange(n), x, 3.0 + 0.02 * x + rng.normal(0, 2, n)
+
+
+def test_fit_matches_polyfit():
+    keys, x, y = sample()
+    band = regression.RegressionBand(n_boot=50)
+    band.update(keys, x, y)
+
+    intercept, slope = band.coefficients()
+    expected_slope, expected_intercept = np.polyfit(x, y, 1)
+    np.testing.assert_allclose([intercept[0], slope[0]], [expected_intercept, expected_slope], rtol=1e-9)
+    grid, fitted, low, high = band.band()
+    np.testing.assert_allclose(fitted, np.polyval([expected_slope, expected_intercept], grid), rtol=1e-9)
+    assert (low <= fitted).all() and (fitted <= high).all()
+
+
+def test_same_seed_gives_the_same_band():
+    keys, x, y = sample()
+    bands = []
+    for seed in (7, 7, 8):
+        band = regression.RegressionBand(n_boot=200, seed=seed)
+        band.update(keys, x, y)
+        bands.append(band.band())
+
+    for first, second in zip(bands[0], bands[1]):
+        np.testing.assert_array_equal(first, second)
+    assert not np.array_equal(bands[0][2], bands[2][2])
+
+
+def test_folding_in_new_days_gives_the_band_of_all_of_them():
+    keys, x, y = sample()
+    incremental = regression.RegressionBand(n_boot=100)
+    incremental.update(keys[:150], x[:150], y[:150])
+    assert incremental.update(keys, x, y) == 50
+
+    whole = regression.RegressionBand(n_boot=100)
+    whole.update(keys, x, y)
+    for first, second in zip(incremental.band(), whole.band()):
+        np.testing.assert_allclose(first, second, rtol=1e-9)
@@ -0,0 +1,60 @@
+import numpy as np
+import pandas as pd
+
+import rolling_stats
+
+
+def expected(values, serial_interval=rolling_stats.serial_interval):
+    values = pd.Series(values, dtype=float)
+    mean_7 = values.rolling(7).mean()
+    previous = mean_7.shift(7)
+    ratio = (mean_7 / previous).where(previous > 0)
+    return pd.DataFrame({'mean_7': mean_7, 'mean_14': values.rolling(14).mean(),
+                         'growth_7': (ratio - 1) * 100, 'rt': ratio ** (serial_interval / 7)})
+
+
+def check(stats, values):
+    frame = stats.frame()
+    assert len(frame) == len(values)
+    pd.testing.assert_frame_equal(frame[rolling_stats.statistics], expected(values), rtol=1e-9)
+
+
+def series(n, seed=0):
+    rng = np.random.default_rng(seed)
+    values = rng.poisson(100, n).astype(float)
+    values[:5] = 0
+    return pd.date_range('2020-01-01', periods=n), values
+
+
+def test_matches_pandas_rolling_as_days_are_added():
+    dates, values = series(1500)
+    stats = rolling_stats.SeriesStats()
+
+    assert stats.update(dates[:10], values[:10]) == 10
+    check(stats, values[:10])
+    for n in (11, 40, 1100, 1500):
+        seen = stats.n
+        assert stats.update(dates[:n], values[:n]) == n - seen
+        check(stats, values[:n])
+    assert stats.update(dates, values) == 0
+
+
+def test_revised_days_are_recomputed():
+    dates, values = series(300)
+    stats = rolling_stats.SeriesStats()
+    stats.update(dates[:290], values[:290])
+
+    revised = values.copy()
+    revised[285] += 500
+    assert stats.update(dates, revised) == 300 - 285
+    check(stats, revised)
+
+
+def test_shifted_history_is_rebuilt():
+    dates, values = series(100)
+    stats = rolling_stats.SeriesStats()
+    stats.update(dates[:90], values[:90])
+
+    assert stats.update(dates[10:], values[10:]) == 90
+    check(stats, values[10:])
+    assert stats.frame().date.iloc[0] == dates[10]
@@ -0,0 +1,26 @@
+import subprocess
+
+import pytest
+
+import shared_data
+
+
+class Loader:
+    # Stands in for the loader process, it exports nothing until told to
+    def __init__(self):
+        self.returncode = None
+
+    def poll(self):
+        return self.returncode
+
+    def terminate(self):
+        self.returncode = -15
+
+
+def test_start_loader_ignores_pointer_of_earlier_run(tmp_path, monkeypatch):
+    (tmp_path / 'current').write_text('old-version')
+    monkeypatch.setattr(subprocess, 'Popen', lambda *args, **kwargs: Loader())
+
+    with pytest.raises(TimeoutError):
+        shared_data.start_loader(str(tmp_path), timeout=0)
+    assert shared_data.read_current(str(tmp_path)) is None
@@ -0,0 +1,54 @@
+# Plotly template shared by every chart of the dashboard.
+#
+# Holds the background, fonts, title placement and axis style the figures used to spell out one by
+# one. It is merged once on top of the plotly template, registered as 'dashboard' and made the
+# default, so a figure only sets what is particular to it. A combined default such as
+# 'plotly+dashboard' would be merged again, and validated, for every figure created.
+import plotly.graph_objects as go
+import plotly.io as pio
+
+name = 'dashboard'
+background = '#47597E'
+
+axis = dict(
+    color='white',
+    showline=True,
+    showticklabels=True,
+    linecolor='white',
+    linewidth=1,
+    ticks='outside',
+    tickfont=dict(
+        family='Arial',
+        size=11,
+        color='white'
+    )
+)
+
+template = go.layout.Template(layout=dict(
+    plot_bgcolor=background,
+    paper_bgcolor=background,
+    hovermode='x',
+    title=dict(
+        y=0.93,
+        x=0.5,
+        xanchor='center',
+        yanchor='top',
+        font=dict(
+            color='white',
+            size=20
+        )
+    ),
+    xaxis=axis,
+    yaxis=axis,
+    legend=dict(
+        bgcolor=background
+    ),
+    font=dict(
+        family='sans-serif',
+        size=11,
+        color='white'
+    )
+))
+
+pio.templates[name] = pio.templates.merge_templates(pio.templates['plotly'], template)
+pio.templates.default = name